@@ -0,0 +1,94 @@
+import asyncio
+import os
+from typing import Dict, List, Tuple
+
+import database, crud, models, scoring, querybudget
+
+BATCH_INTERVAL_SECONDS = float(os.getenv("ANSWER_BATCH_INTERVAL_MS", "50")) / 1000
+BATCH_MAX_SIZE = int(os.getenv("ANSWER_BATCH_MAX_SIZE", "200"))
+
+
+class AnswerQueue:
+    def __init__(self, session_factory=None,
+                 batch_interval: float = BATCH_INTERVAL_SECONDS,
+                 batch_size: int = BATCH_MAX_SIZE):
+        self.session_factory = session_factory
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.workers: Dict[str, asyncio.Task] = {}
+        self.scorers: Dict[str, scoring.RoomScorer] = {}
+        self.question_keys: Dict[str, Dict[int, scoring.QuestionKey]] = {}
+
+    async def submit(self, room_code: str, participant_id: int, question_id: int,
+                     choice_ids: List[int], response_time: float) -> Tuple[float, bool]:
+        future = asyncio.get_running_loop().create_future()
+        self._queue(room_code).put_nowait(({
+            "participant_id": participant_id,
+            "question_id": question_id,
+            "choice_ids": choice_ids,
+            "response_time": response_time
+        }, future))
+        return await future
+
+    def configure(self, room_code: str, scorer: scoring.RoomScorer):
+        self.scorers[room_code] = scorer
+        self.question_keys[room_code] = {}
+
+    def discard(self, room_code: str):
+        worker = self.workers.pop(room_code, None)
+        if worker:
+            worker.cancel()
+        self.queues.pop(room_code, None)
+        self.scorers.pop(room_code, None)
+        self.question_keys.pop(room_code, None)
+
+    def _queue(self, room_code: str) -> asyncio.Queue:
+        queue = self.queues.get(room_code)
+        if queue is None:
+            queue = self.queues[room_code] = asyncio.Queue()
+            self.workers[room_code] = asyncio.create_task(self._drain(room_code, queue))
+        return queue
+
+    async def _drain(self, room_code: str, queue: asyncio.Queue):
+        # batched writes belong to no single websocket action
+        querybudget.detach()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.batch_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            submissions = [submission for submission, _ in batch]
+            try:
+                results = await asyncio.to_thread(self._write, room_code, submissions)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _write(self, room_code: str, submissions: List[dict]) -> List[Tuple[float, bool]]:
+        session_factory = self.session_factory or database.SessionLocal
+        db = session_factory()
+        try:
+            scorer = self.scorers.get(room_code)
+            if scorer is None:
+                room = db.query(models.Room).filter(models.Room.code == room_code).first()
+                strategy = scoring.resolve(room.scoring_mode, room.scoring_params) if room else scoring.ScoringStrategy()
+                scorer = self.scorers[room_code] = scoring.RoomScorer(strategy)
+            question_keys = self.question_keys.setdefault(room_code, {})
+            return crud.process_answers(db, submissions, scorer, question_keys)
+        finally:
+            db.close()
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from starlette.websockets import WebSocket, WebSocketState
+
+from rooms import ConnectionManager
+
+SOCKETS = 1000
+ROUNDS = 50
+
+MESSAGE = {
+    "event": "next_question",
+    "question": {
+        "id": 42,
+        "text": "Какая планета Солнечной системы самая большая?",
+        "timer_seconds": 20,
+        "choices": [
+            {"id": 1, "text": "Юпитер"},
+            {"id": 2, "text": "Сатурн"},
+            {"id": 3, "text": "Нептун"},
+            {"id": 4, "text": "Земля"},
+        ],
+    },
+}
+
+
+async def _receive():
+    return {"type": "websocket.connect"}
+
+
+async def _send(message):
+    pass
+
+
+def make_socket():
+    ws = WebSocket({"type": "websocket", "path": "/ws", "headers": []}, _receive, _send)
+    ws.client_state = WebSocketState.CONNECTED
+    ws.application_state = WebSocketState.CONNECTED
+    return ws
+
+
+async def legacy_broadcast(sockets, message):
+    for connection in sockets:
+        await connection.send_json(message)
+
+
+async def run():
+    manager = ConnectionManager()
+    sockets = [make_socket() for _ in range(SOCKETS)]
+    manager.active_connections["BENCH"] = sockets
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await legacy_broadcast(sockets, MESSAGE)
+    legacy = (time.perf_counter() - start) / ROUNDS
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await manager.broadcast("BENCH", MESSAGE)
+        await manager.flush()
+    current = (time.perf_counter() - start) / ROUNDS
+
+    size = len(json.dumps(MESSAGE, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    print(f"payload: {size} bytes, sockets: {SOCKETS}, rounds: {ROUNDS}")
+    print(f"send_json per socket:     {legacy * 1000:.3f} ms per {SOCKETS} sockets")
+    print(f"pre-encoded broadcast:    {current * 1000:.3f} ms per {SOCKETS} sockets")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
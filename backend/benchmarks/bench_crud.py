@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy import delete, desc, func, insert, select
+
+import crud
+import models
+import schemas
+import seed
+
+LIVE_PLAYERS = 2000
+
+
+@pytest.fixture(scope="module")
+def live_room(seeded_engine):
+    tables = models.Base.metadata.tables
+    with seeded_engine.begin() as conn:
+        room_id = conn.execute(insert(tables["rooms"]).values(code="LIVE01", quiz_id=1, status="active")).inserted_primary_key[0]
+        conn.execute(insert(tables["participants"]), [
+            {"room_id": room_id, "nickname": f"live{i}", "is_approved": True, "score": 0.0}
+            for i in range(LIVE_PLAYERS)
+        ])
+        participant_ids = conn.execute(
+            select(tables["participants"].c.id).where(tables["participants"].c.room_id == room_id)
+        ).scalars().all()
+    return room_id, participant_ids
+
+
+@pytest.fixture(scope="module")
+def busiest_player(seeded_engine):
+    participants = models.Participant.__table__
+    with seeded_engine.connect() as conn:
+        return conn.execute(
+            select(participants.c.user_id).where(participants.c.user_id.isnot(None))
+            .group_by(participants.c.user_id).order_by(desc(func.count())).limit(1)
+        ).scalar()
+
+
+def test_process_answer(benchmark, db, live_room):
+    _, participant_ids = live_room
+    participants = iter(participant_ids)
+
+    def setup():
+        return (db, next(participants), 1, 1, 4.2), {}
+
+    score = benchmark.pedantic(crud.process_answer, setup=setup, rounds=min(500, LIVE_PLAYERS))
+    assert score > 0
+
+
+def test_get_leaderboard(benchmark, db):
+    leaderboard = benchmark(crud.get_leaderboard, db, 1)
+    assert len(leaderboard) == seed.PLAYERS_PER_ROOM
+
+
+def test_get_history(benchmark, db, busiest_player):
+    history = benchmark(crud.get_history, db, busiest_player)
+    assert history
+
+
+def test_get_quizzes(benchmark, db):
+    quizzes = benchmark(crud.get_quizzes, db, 1)
+    assert len(quizzes) == seed.QUIZZES // seed.QUIZ_AUTHORS
+
+
+def test_reset_room_scores(benchmark, db, seeded_engine):
+    tables = models.Base.metadata.tables
+    with seeded_engine.connect() as conn:
+        answers = [dict(row._mapping) for row in conn.execute(
+            select(tables["answers"]).join(tables["participants"]).where(tables["participants"].c.room_id == 2)
+        )]
+    for answer in answers:
+        answer.pop("id")
+
+    def setup():
+        with seeded_engine.begin() as conn:
+            conn.execute(delete(tables["answers"]).where(
+                tables["answers"].c.participant_id.in_({answer["participant_id"] for answer in answers})
+            ))
+            conn.execute(insert(tables["answers"]), answers)
+        return (db, 2), {}
+
+    benchmark.pedantic(crud.reset_room_scores, setup=setup, rounds=50)
+    remaining = db.query(models.Answer).join(models.Participant).filter(models.Participant.room_id == 2).count()
+    assert remaining == 0
+
+
+def test_add_question_to_quiz(benchmark, db):
+    question = schemas.QuestionCreate(
+        text="Какая планета самая большая?",
+        timer_seconds=20,
+        choices=[schemas.ChoiceCreate(text=text, is_correct=i == 0)
+                 for i, text in enumerate(["Юпитер", "Сатурн", "Нептун", "Земля"])]
+    )
+    created = benchmark(crud.add_question_to_quiz, db, 2, question)
+    assert len(created.choices) == 4
@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+import numpy as np
+
+from rescoring import score_answers
+
+ANSWERS = int(os.getenv("BENCH_ANSWERS", "1000000"))
+QUESTIONS = 500
+
+
+def python_scores(question_ids, is_correct, response_times, timers):
+    order_multipliers = {1: 1.0, 2: 0.8, 3: 0.6}
+    correct_counts = {}
+    points = []
+    for question_id, correct, response_time, timer in zip(question_ids, is_correct, response_times, timers):
+        score_earned = 0
+        if correct:
+            answer_order = correct_counts.get(question_id, 0) + 1
+            correct_counts[question_id] = answer_order
+            order_factor = order_multipliers.get(answer_order, 0.4)
+            effective_time = min(response_time, timer)
+            time_factor = 1 - (effective_time / timer / 2)
+            score_earned = round(1000 * order_factor * time_factor)
+        if response_time > timer + 2.0:
+            score_earned = 0
+        points.append(score_earned)
+    return points
+
+
+def run():
+    rng = np.random.default_rng(42)
+    question_ids = rng.integers(1, QUESTIONS + 1, ANSWERS)
+    is_correct = rng.random(ANSWERS) < 0.6
+    timers = np.full(ANSWERS, 20)
+    response_times = rng.uniform(0, 25, ANSWERS)
+
+    start = time.perf_counter()
+    vectorized = score_answers(question_ids, is_correct, response_times, timers)
+    vectorized_time = time.perf_counter() - start
+
+    columns = (question_ids.tolist(), is_correct.tolist(), response_times.tolist(), timers.tolist())
+    start = time.perf_counter()
+    reference = python_scores(*columns)
+    python_time = time.perf_counter() - start
+
+    assert vectorized.tolist() == reference
+    print(f"answers: {ANSWERS}, questions: {QUESTIONS}")
+    print(f"python loop:  {python_time * 1000:.1f} ms")
+    print(f"numpy:        {vectorized_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import seed
+
+
+@pytest.fixture(scope="session")
+def seeded_engine():
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/bench_crud.db"
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(url)
+    if os.getenv("BENCH_REUSE_DB", "false").lower() != "true" or not seed.is_seeded(engine):
+        seed.seed(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(seeded_engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=seeded_engine)()
+    yield session
+    session.rollback()
+    session.close()
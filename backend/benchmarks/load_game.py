@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+import httpx
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+SCENARIOS = {
+    "smoke": {"rooms": 2, "players": 10, "questions": 3},
+    "standard": {"rooms": 10, "players": 30, "questions": 5},
+    "crowded": {"rooms": 2, "players": 200, "questions": 3},
+}
+
+# metric -> whether a larger value is better
+CHECKED_METRICS = {
+    "answers_per_second": True,
+    "answer_p99_ms": False,
+    "broadcast_p99_ms": False,
+    "db_queries_per_answer": False,
+}
+TIMING_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.5"))
+DB_TOLERANCE = 0.1
+
+
+class AsgiSocket:
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.outbox: asyncio.Queue = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [],
+            "server": ("bench", 80),
+            "client": ("bench", 1),
+            "subprotocols": [],
+        }
+        await self.inbox.put({"type": "websocket.connect"})
+        self.task = asyncio.create_task(self.app(scope, self.inbox.get, self.outbox.put))
+        message = await self.outbox.get()
+        if message["type"] != "websocket.accept":
+            raise ConnectionError(f"{self.path}: {message}")
+
+    async def send(self, data: dict):
+        await self.inbox.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def recv(self) -> dict:
+        while True:
+            message = await self.outbox.get()
+            if message["type"] == "websocket.send":
+                return json.loads(message["text"])
+            if message["type"] == "websocket.close":
+                raise ConnectionError(f"{self.path}: closed with {message.get('code')}")
+
+    async def close(self):
+        await self.inbox.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, timeout=10)
+
+
+class NetworkSocket:
+    def __init__(self, base_url: str, path: str):
+        self.url = base_url.replace("http", "ws", 1).rstrip("/") + path
+        self.connection = None
+
+    async def connect(self):
+        import websockets
+
+        self.connection = await websockets.connect(self.url, max_size=None)
+
+    async def send(self, data: dict):
+        await self.connection.send(json.dumps(data))
+
+    async def recv(self) -> dict:
+        return json.loads(await self.connection.recv())
+
+    async def close(self):
+        await self.connection.close()
+
+
+class Client:
+    def __init__(self, socket):
+        self.socket = socket
+        self.received = 0
+
+    async def expect(self, event: str, predicate=None):
+        while True:
+            message = await self.socket.recv()
+            self.received += 1
+            if message.get("event") == event and (predicate is None or predicate(message)):
+                return message, time.perf_counter()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def db_query_count(http: httpx.AsyncClient) -> int:
+    text = (await http.get("/metrics")).text
+    return sum(int(float(line.rsplit(" ", 1)[1])) for line in text.splitlines()
+               if line.startswith("myquiz_db_query_duration_seconds_count"))
+
+
+async def prepare(http: httpx.AsyncClient, rooms: int, questions: int):
+    username = f"bench-host-{random.randrange(10 ** 9)}"
+    await http.post("/register", json={"username": username, "password": "bench-password"})
+    token = (await http.post("/login", json={"username": username, "password": "bench-password"})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    quiz_id = (await http.post("/quizzes", json={"title": "Load test"}, headers=headers)).json()["id"]
+    for q in range(questions):
+        choices = [{"text": f"Вариант {c}", "is_correct": c == 0} for c in range(4)]
+        await http.post(f"/quizzes/{quiz_id}/questions",
+                        json={"text": f"Вопрос {q}", "timer_seconds": 20, "choices": choices}, headers=headers)
+    return [(await http.post(f"/rooms/create/{quiz_id}", headers=headers)).json()["code"] for _ in range(rooms)]
+
+
+async def play_room(open_socket, code: str, players: int, questions: int, rng: random.Random, samples: dict):
+    host = Client(open_socket(f"/ws/{code}/host"))
+    await host.socket.connect()
+    clients = [Client(open_socket(f"/ws/{code}/player")) for _ in range(players)]
+    for client in clients:
+        await client.socket.connect()
+
+    for i, client in enumerate(clients):
+        await client.socket.send({"action": "join_room", "nickname": f"bot-{code}-{i}"})
+    participant_ids = [(await client.expect("waiting_approval"))[0]["participant_id"] for client in clients]
+    for participant_id in participant_ids:
+        await host.socket.send({"action": "approve_player", "participant_id": participant_id})
+    await host.expect("participants_update", lambda message: message["count"] == players)
+
+    async def answer(client, participant_id, question):
+        choice = rng.choice(question["choices"])
+        started = time.perf_counter()
+        await client.socket.send({
+            "action": "submit_answer",
+            "participant_id": participant_id,
+            "question_id": question["id"],
+            "choice_ids": [choice["id"]],
+            "response_time": round(rng.uniform(1, 10), 2),
+        })
+        _, received_at = await client.expect("answer_result")
+        samples["answer"].append(received_at - started)
+
+    sent_at = time.perf_counter()
+    await host.socket.send({"action": "start_quiz"})
+    event = "quiz_started"
+    for _ in range(questions):
+        delivered = await asyncio.gather(*(client.expect(event) for client in clients))
+        samples["broadcast"].extend(received_at - sent_at for _, received_at in delivered)
+        await asyncio.gather(*(answer(client, participant_id, message["question"])
+                               for client, participant_id, (message, _) in zip(clients, participant_ids, delivered)))
+        sent_at = time.perf_counter()
+        await host.socket.send({"action": "next_question"})
+        event = "next_question"
+    delivered = await asyncio.gather(*(client.expect("quiz_finished") for client in clients))
+    samples["broadcast"].extend(received_at - sent_at for _, received_at in delivered)
+
+    samples["events"] += host.received + sum(client.received for client in clients)
+    for client in clients:
+        await client.socket.close()
+    await host.socket.close()
+
+
+async def run_scenario(http: httpx.AsyncClient, open_socket, rooms: int, players: int, questions: int, seed: int = 42):
+    codes = await prepare(http, rooms, questions)
+    rng = random.Random(seed)
+    samples = {"answer": [], "broadcast": [], "events": 0}
+
+    queries_before = await db_query_count(http)
+    started = time.perf_counter()
+    await asyncio.gather(*(play_room(open_socket, code, players, questions, rng, samples) for code in codes))
+    elapsed = time.perf_counter() - started
+    queries = await db_query_count(http) - queries_before
+
+    answers = len(samples["answer"])
+    return {
+        "rooms": rooms,
+        "players_per_room": players,
+        "questions": questions,
+        "seconds": round(elapsed, 3),
+        "answers": answers,
+        "answers_per_second": round(answers / elapsed, 1),
+        "events_per_second": round(samples["events"] / elapsed, 1),
+        "answer_p50_ms": round(percentile(samples["answer"], 0.5) * 1000, 2),
+        "answer_p99_ms": round(percentile(samples["answer"], 0.99) * 1000, 2),
+        "broadcast_p50_ms": round(percentile(samples["broadcast"], 0.5) * 1000, 2),
+        "broadcast_p99_ms": round(percentile(samples["broadcast"], 0.99) * 1000, 2),
+        "db_queries": queries,
+        "db_queries_per_answer": round(queries / answers, 3) if answers else 0.0,
+    }
+
+
+def regressions(result: dict, baseline: dict):
+    found = []
+    for metric, higher_is_better in CHECKED_METRICS.items():
+        if metric not in baseline:
+            continue
+        tolerance = DB_TOLERANCE if metric.startswith("db_") else TIMING_TOLERANCE
+        expected, actual = baseline[metric], result[metric]
+        if higher_is_better and actual < expected * (1 - tolerance):
+            found.append(f"{metric}: {actual} < {expected} (-{tolerance:.0%})")
+        if not higher_is_better and actual > expected * (1 + tolerance):
+            found.append(f"{metric}: {actual} > {expected} (+{tolerance:.0%})")
+    return found
+
+
+async def main(args):
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=60)
+        open_socket = lambda path: NetworkSocket(args.url, path)
+    else:
+        if "DATABASE_URL" not in os.environ:
+            os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load_game.db"
+        from main import app
+
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        open_socket = lambda path: AsgiSocket(app, path)
+
+    results = {}
+    async with http:
+        for name in args.scenarios:
+            results[name] = await run_scenario(http, open_socket, **SCENARIOS[name])
+            print(f"{name}: " + ", ".join(f"{k}={v}" for k, v in results[name].items()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate full games against the app and report throughput and latency.")
+    parser.add_argument("scenarios", nargs="*", default=["smoke", "standard"], choices=sorted(SCENARIOS))
+    parser.add_argument("--url", help="run against a live server, e.g. http://127.0.0.1:8000 (needs the websockets package)")
+    parser.add_argument("--check", action="store_true", help="exit with 1 if results regress against baselines.json")
+    parser.add_argument("--update-baseline", action="store_true", help="store results in baselines.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as f:
+            baselines = json.load(f)
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINES_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.check:
+        failed = {name: regressions(result, baselines[name]) for name, result in results.items() if name in baselines}
+        failed = {name: found for name, found in failed.items() if found}
+        for name, found in failed.items():
+            print(f"REGRESSION {name}: " + "; ".join(found))
+        sys.exit(1 if failed else 0)
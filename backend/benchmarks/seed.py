@@ -0,0 +1,141 @@
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/..")
+
+from sqlalchemy import create_engine, event, func, insert, select, text
+
+import models
+
+USERS = int(os.getenv("BENCH_USERS", "10000"))
+QUIZZES = int(os.getenv("BENCH_QUIZZES", "1000"))
+ANSWERS = int(os.getenv("BENCH_ANSWERS", "1000000"))
+QUESTIONS_PER_QUIZ = 10
+CHOICES_PER_QUESTION = 4
+PLAYERS_PER_ROOM = 20
+QUIZ_AUTHORS = 100
+CHUNK_SIZE = 50000
+
+EPOCH = datetime.datetime(2024, 1, 1)
+
+
+def _chunks(rows, table, conn):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            conn.execute(insert(table), batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+
+
+def is_seeded(engine, users: int = USERS) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(models.User.__table__)).scalar() == users
+
+
+def seed(engine, users: int = USERS, quizzes: int = QUIZZES, answers: int = ANSWERS, rng_seed: int = 42):
+    rng = random.Random(rng_seed)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _fast_seed(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA journal_mode = MEMORY")
+            cursor.close()
+        engine.dispose()
+
+    questions = quizzes * QUESTIONS_PER_QUIZ
+    rooms = max(1, answers // (QUESTIONS_PER_QUIZ * PLAYERS_PER_ROOM))
+    tables = models.Base.metadata.tables
+
+    with engine.begin() as conn:
+        _chunks(({"id": i, "username": f"user{i}", "hashed_password": "x"} for i in range(1, users + 1)),
+                tables["users"], conn)
+        _chunks(({"id": i, "name": f"Category {i}"} for i in range(1, 8)), tables["categories"], conn)
+        _chunks(({
+            "id": i,
+            "title": f"Quiz {i}",
+            "creator_id": i % min(QUIZ_AUTHORS, users) + 1,
+            "category_id": i % 7 + 1,
+            "default_timer_seconds": 20,
+            "created_at": EPOCH + datetime.timedelta(minutes=i),
+        } for i in range(1, quizzes + 1)), tables["quizzes"], conn)
+        _chunks(({
+            "id": i,
+            "text": f"Question {i}",
+            "quiz_id": (i - 1) // QUESTIONS_PER_QUIZ + 1,
+            "timer_seconds": 20,
+            "question_type": "single",
+        } for i in range(1, questions + 1)), tables["questions"], conn)
+        _chunks(({
+            "id": i,
+            "text": f"Choice {i}",
+            "is_correct": (i - 1) % CHOICES_PER_QUESTION == 0,
+            "question_id": (i - 1) // CHOICES_PER_QUESTION + 1,
+        } for i in range(1, questions * CHOICES_PER_QUESTION + 1)), tables["choices"], conn)
+        _chunks(({
+            "id": i,
+            "code": f"R{i:05d}",
+            "quiz_id": i % quizzes + 1,
+            "status": "finished",
+            "created_at": EPOCH + datetime.timedelta(minutes=i),
+        } for i in range(1, rooms + 1)), tables["rooms"], conn)
+
+        participant_users = [rng.randrange(1, users + 1) for _ in range(rooms * PLAYERS_PER_ROOM)]
+        _chunks(({
+            "id": i + 1,
+            "room_id": i // PLAYERS_PER_ROOM + 1,
+            "user_id": user_id,
+            "is_approved": True,
+            "score": 0.0,
+        } for i, user_id in enumerate(participant_users)), tables["participants"], conn)
+
+        def answer_rows():
+            answer_id = 0
+            for participant_index in range(rooms * PLAYERS_PER_ROOM):
+                room_id = participant_index // PLAYERS_PER_ROOM + 1
+                first_question = (room_id % quizzes) * QUESTIONS_PER_QUIZ + 1
+                for question_id in range(first_question, first_question + QUESTIONS_PER_QUIZ):
+                    answer_id += 1
+                    pick = rng.randrange(CHOICES_PER_QUESTION)
+                    choice_id = (question_id - 1) * CHOICES_PER_QUESTION + pick + 1
+                    yield {
+                        "id": answer_id,
+                        "participant_id": participant_index + 1,
+                        "question_id": question_id,
+                        "choice_id": choice_id,
+                        "choice_ids": [choice_id],
+                        "response_time": round(rng.uniform(1, 20), 2),
+                        "is_correct": pick == 0,
+                        "points": 500.0 if pick == 0 else 0.0,
+                    }
+
+        _chunks(answer_rows(), tables["answers"], conn)
+
+    with engine.begin() as conn:
+        scores = select(func.coalesce(func.sum(tables["answers"].c.points), 0)).where(
+            tables["answers"].c.participant_id == tables["participants"].c.id
+        ).scalar_subquery()
+        conn.execute(tables["participants"].update().values(score=scores))
+        if engine.dialect.name == "postgresql":
+            for table in tables.values():
+                if "id" in table.c and table.c.id.autoincrement is not False:
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table.name}), false)"
+                    ))
+
+
+if __name__ == "__main__":
+    url = os.getenv("BENCH_DATABASE_URL", "sqlite:///./bench.db")
+    started = time.perf_counter()
+    seed(create_engine(url))
+    print(f"seeded {url}: {USERS} users, {QUIZZES} quizzes, {ANSWERS} answers in {time.perf_counter() - started:.1f}s")
@@ -1,6 +1,8 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-import models, schemas
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import bindparam, desc, func, insert
+from sqlalchemy.exc import IntegrityError
+import datetime
+import models, schemas, scoring
 
 def update_user(db: Session, user_id: int, user_data: schemas.UserUpdate):
     user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -14,46 +16,51 @@ def update_user(db: Session, user_id: int, user_data: schemas.UserUpdate):
     return user
 
 def get_history(db: Session, user_id: int):
-    hosted_rooms = db.query(models.Room).join(models.Quiz).filter(
+    hosted_rooms = db.query(models.Room.code, models.Room.created_at, models.Quiz.title).join(models.Quiz).filter(
         models.Quiz.creator_id == user_id,
         models.Room.status == 'finished'
     ).all()
 
     history = []
-    for room in hosted_rooms:
+    for code, created_at, title in hosted_rooms:
         history.append(schemas.HistoryEntry(
-            room_code=room.code,
-            quiz_title=room.quiz.title,
-            date=room.created_at,
+            room_code=code,
+            quiz_title=title,
+            date=created_at,
             role='host',
             score=None,
             rank=None
         ))
 
-    participations = db.query(models.Participant).join(models.Room).filter(
+    participations = db.query(
+        models.Participant.id, models.Participant.room_id, models.Participant.score,
+        models.Room.code, models.Room.created_at, models.Quiz.title
+    ).join(models.Room, models.Participant.room_id == models.Room.id).join(
+        models.Quiz, models.Room.quiz_id == models.Quiz.id
+    ).filter(
         models.Participant.user_id == user_id,
         models.Room.status == 'finished',
         models.Participant.is_approved == True
     ).all()
 
-    for p in participations:
-        all_participants = db.query(models.Participant).filter(
-            models.Participant.room_id == p.room_id,
+    standings = {}
+    if participations:
+        ranked = db.query(models.Participant.id, models.Participant.room_id).filter(
+            models.Participant.room_id.in_({p.room_id for p in participations}),
             models.Participant.is_approved == True
-        ).order_by(desc(models.Participant.score)).all()
-        
-        rank_idx = -1
-        for idx, ap in enumerate(all_participants):
-            if ap.id == p.id:
-                rank_idx = idx + 1
-                break
-        
-        rank_str = f"{rank_idx}/{len(all_participants)}"
+        ).order_by(models.Participant.room_id, desc(models.Participant.score)).all()
+        for participant_id, room_id in ranked:
+            standings.setdefault(room_id, []).append(participant_id)
+
+    for p in participations:
+        room_standings = standings.get(p.room_id, [])
+        rank_idx = room_standings.index(p.id) + 1 if p.id in room_standings else -1
+        rank_str = f"{rank_idx}/{len(room_standings)}"
 
         history.append(schemas.HistoryEntry(
-            room_code=p.room.code,
-            quiz_title=p.room.quiz.title,
-            date=p.room.created_at,
+            room_code=p.code,
+            quiz_title=p.title,
+            date=p.created_at,
             role='player',
             score=p.score,
             rank=rank_str
@@ -154,7 +161,9 @@ def update_question(db: Session, question_id: int, question_data: schemas.Questi
     return db_question
 
 def get_questions_for_quiz(db: Session, quiz_id: int):
-    return db.query(models.Question).filter(models.Question.quiz_id == quiz_id).all()
+    return db.query(models.Question).options(selectinload(models.Question.choices)).filter(
+        models.Question.quiz_id == quiz_id
+    ).all()
 
 def delete_question(db: Session, question_id: int):
     db_question = db.query(models.Question).filter(models.Question.id == question_id).first()
@@ -175,6 +184,12 @@ def create_room(db: Session, quiz_id: int):
 def get_room(db: Session, room_code: str):
     return db.query(models.Room).filter(models.Room.code == room_code).first()
 
+def count_approved_participants(db: Session, room_id: int):
+    return db.query(func.count(models.Participant.id)).filter(
+        models.Participant.room_id == room_id,
+        models.Participant.is_approved == True
+    ).scalar()
+
 def update_room_status(db: Session, room_code: str, status: str):
     room = db.query(models.Room).filter(models.Room.code == room_code).first()
     if room:
@@ -202,19 +217,16 @@ def get_participants(db: Session, room_id: int):
     return db.query(models.Participant).filter(models.Participant.room_id == room_id).all()
 
 def get_leaderboard(db: Session, room_id: int):
-    participants = db.query(models.Participant).filter(
+    participants = db.query(models.Participant, models.User.username).outerjoin(
+        models.User, models.Participant.user_id == models.User.id
+    ).filter(
         models.Participant.room_id == room_id,
         models.Participant.is_approved == True
     ).order_by(desc(models.Participant.score)).all()
     
     result = []
-    for p in participants:
-        username = p.nickname  
-        if not username and p.user_id:
-            user = db.query(models.User).filter(models.User.id == p.user_id).first()
-            username = user.username if user else f"Player {p.id}"
-        else:
-            username = username or f"Player {p.id}"
+    for p, user_username in participants:
+        username = p.nickname or user_username or f"Player {p.id}"
         
         result.append(schemas.LeaderboardEntry(
             user_id=p.user_id,
@@ -224,66 +236,306 @@ def get_leaderboard(db: Session, room_id: int):
         ))
     return result
 
-def process_answer(db: Session, participant_id: int, question_id: int, choice_id: int, response_time: float):
-    choice = db.query(models.Choice).filter(models.Choice.id == choice_id).first()
-    question = db.query(models.Question).filter(models.Question.id == question_id).first()
+def load_question_keys(db: Session, question_ids: set):
+    questions = db.query(models.Question.id, models.Question.timer_seconds, models.Question.question_type).filter(
+        models.Question.id.in_(question_ids)
+    ).all()
+    choices = db.query(models.Choice.id, models.Choice.question_id, models.Choice.is_correct).filter(
+        models.Choice.question_id.in_(question_ids)
+    ).all()
 
-    if not choice or not question:
-        return 0
+    choice_ids, correct_ids = {}, {}
+    for choice_id, question_id, is_correct in choices:
+        choice_ids.setdefault(question_id, set()).add(choice_id)
+        if is_correct:
+            correct_ids.setdefault(question_id, set()).add(choice_id)
+
+    return {
+        question_id: scoring.QuestionKey(
+            timer_seconds=timer_seconds,
+            multiple=question_type == "multiple",
+            choice_ids=frozenset(choice_ids.get(question_id, ())),
+            correct_ids=frozenset(correct_ids.get(question_id, ()))
+        )
+        for question_id, timer_seconds, question_type in questions
+    }
+
+def add_participant_scores(db: Session, score_deltas: dict):
+    participants = models.Participant.__table__
+    db.execute(
+        participants.update().where(participants.c.id == bindparam("participant_id")).values(
+            score=participants.c.score + bindparam("delta")
+        ),
+        [{"participant_id": participant_id, "delta": delta} for participant_id, delta in score_deltas.items()]
+    )
 
-    is_correct = choice.is_correct
-    score_earned = 0
-    timer = question.timer_seconds
-    
-    if is_correct:
-        max_points = 1000
-        
-        earlier_answers = db.query(models.Answer).filter(
-            models.Answer.question_id == question_id,
-            models.Answer.is_correct == True
-        ).all()
-        
-        answer_order = len(earlier_answers) + 1  
-        
-        order_multipliers = {1: 1.0, 2: 0.8, 3: 0.6}
-        order_factor = order_multipliers.get(answer_order, 0.4)
-        
-        
-        
-        
-        effective_time = min(response_time, timer)
-        time_factor = 1 - (effective_time / timer / 2)
-        
-        score_earned = round(max_points * order_factor * time_factor)
+def process_answers(db: Session, submissions: list, scorer: scoring.RoomScorer = None,
+                    question_keys: dict = None, retry: bool = True):
+    scorer = scorer or scoring.DEFAULT_SCORER
+    question_keys = question_keys if question_keys is not None else {}
+    pairs = {(s["participant_id"], s["question_id"]) for s in submissions}
+    participant_ids = {p for p, _ in pairs}
+    question_ids = {q for _, q in pairs}
+
+    rounds = dict(db.query(models.Participant.id, models.Room.current_round).join(
+        models.Room, models.Room.id == models.Participant.room_id
+    ).filter(models.Participant.id.in_(participant_ids)).all())
+
+    stored = {}
+    existing = db.query(models.Answer).filter(
+        models.Answer.participant_id.in_(participant_ids),
+        models.Answer.question_id.in_(question_ids)
+    ).all()
+    for a in existing:
+        if a.round == rounds.get(a.participant_id, 1):
+            stored[(a.participant_id, a.question_id)] = (a.points, a.is_correct)
+
+    missing = question_ids - question_keys.keys()
+    if missing:
+        question_keys.update(load_question_keys(db, missing))
+
+    correct_counts = dict(db.query(models.Answer.question_id, func.count(models.Answer.id)).filter(
+        models.Answer.question_id.in_(question_ids),
+        models.Answer.is_correct == True
+    ).group_by(models.Answer.question_id).all())
+
+    score_deltas = {}
+    results = []
+    for s in submissions:
+        key = (s["participant_id"], s["question_id"])
+        if key in stored:
+            results.append(stored[key])
+            continue
+
+        question = question_keys.get(s["question_id"])
+        selected = frozenset(s["choice_ids"]) & question.choice_ids if question else frozenset()
+        if not selected:
+            results.append((0, False))
+            continue
+
+        correctness, is_correct = scoring.choice_correctness(selected, question, scorer.partial_credit)
+        response_time = s["response_time"]
+        answer_order = correct_counts.get(s["question_id"], 0) + 1
+        if is_correct:
+            correct_counts[s["question_id"]] = answer_order
+
+        score_earned = scorer(s["participant_id"], correctness, answer_order,
+                              response_time, question.timer_seconds)
+
+        db.add(models.Answer(
+            participant_id=s["participant_id"],
+            question_id=s["question_id"],
+            choice_id=next(iter(selected)) if len(selected) == 1 else None,
+            choice_ids=sorted(selected),
+            response_time=response_time,
+            is_correct=is_correct,
+            points=score_earned,
+            round=rounds.get(s["participant_id"], 1)
+        ))
+        score_deltas[s["participant_id"]] = score_deltas.get(s["participant_id"], 0) + score_earned
+        stored[key] = (score_earned, is_correct)
+        results.append(stored[key])
 
-    
-    if response_time > timer + 2.0:
-        score_earned = 0
-
-    new_answer = models.Answer(
-        participant_id=participant_id,
-        question_id=question_id,
-        choice_id=choice_id,
-        response_time=response_time,
-        is_correct=is_correct,
-        points=score_earned
-    )
-    db.add(new_answer)
+    if score_deltas:
+        add_participant_scores(db, score_deltas)
 
-    participant = db.query(models.Participant).filter(models.Participant.id == participant_id).first()
-    if participant:
-        participant.score += score_earned
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if not retry:
+            raise
+        return process_answers(db, submissions, scorer, question_keys, retry=False)
+    return results
+
+def process_answer(db: Session, participant_id: int, question_id: int, choice_id: int, response_time: float,
+                   choice_ids: list = None):
+    score_earned, _ = process_answers(db, [{
+        "participant_id": participant_id,
+        "question_id": question_id,
+        "choice_ids": choice_ids if choice_ids is not None else [choice_id],
+        "response_time": response_time
+    }])[0]
+    return score_earned
 
+def save_answer_distribution(db: Session, room_id: int, question_id: int, counts: dict):
+    db.query(models.AnswerDistribution).filter(
+        models.AnswerDistribution.room_id == room_id,
+        models.AnswerDistribution.question_id == question_id
+    ).delete(synchronize_session=False)
+    if counts:
+        db.execute(insert(models.AnswerDistribution), [
+            {"room_id": room_id, "question_id": question_id, "choice_id": choice_id, "count": count}
+            for choice_id, count in counts.items()
+        ])
     db.commit()
-    return score_earned
 
 def reset_room_scores(db: Session, room_id: int):
-    participants = db.query(models.Participant).filter(models.Participant.room_id == room_id).all()
-    for p in participants:
-        p.score = 0.0
-    
-    participant_ids = [p.id for p in participants]
-    if participant_ids:
-        db.query(models.Answer).filter(models.Answer.participant_id.in_(participant_ids)).delete(synchronize_session=False)
-    
-    db.commit()
\ No newline at end of file
+    db.query(models.Participant).filter(models.Participant.room_id == room_id).update(
+        {models.Participant.score: 0.0}, synchronize_session=False
+    )
+    played = db.query(models.Answer.id).join(
+        models.Participant, models.Participant.id == models.Answer.participant_id
+    ).filter(
+        models.Participant.room_id == room_id,
+        models.Answer.round == models.Room.current_round
+    ).exists()
+    db.query(models.Room).filter(models.Room.id == room_id, played).update(
+        {models.Room.current_round: models.Room.current_round + 1}, synchronize_session=False
+    )
+    db.commit()
+
+RESPONSE_TIME_BUCKET_SECONDS = 0.5
+RESPONSE_TIME_BUCKETS = 120
+HARDEST_QUESTIONS_LIMIT = 5
+
+def _response_time_bucket(response_time: float):
+    idx = int((response_time or 0.0) / RESPONSE_TIME_BUCKET_SECONDS)
+    return min(max(idx, 0), RESPONSE_TIME_BUCKETS - 1)
+
+def _median_from_buckets(buckets: list, total: int):
+    if not total:
+        return 0.0
+    seen = 0
+    for idx, count in enumerate(buckets):
+        seen += count
+        if seen * 2 >= total:
+            return (idx + 0.5) * RESPONSE_TIME_BUCKET_SECONDS
+    return RESPONSE_TIME_BUCKETS * RESPONSE_TIME_BUCKET_SECONDS
+
+def _apply_stats(target, source, sign: int):
+    target.answers_count = (target.answers_count or 0) + sign * source.answers_count
+    target.correct_count = (target.correct_count or 0) + sign * source.correct_count
+    target.response_time_sum = (target.response_time_sum or 0.0) + sign * source.response_time_sum
+    buckets = list(target.response_time_buckets or [0] * RESPONSE_TIME_BUCKETS)
+    for idx, count in enumerate(source.response_time_buckets):
+        buckets[idx] += sign * count
+    target.response_time_buckets = buckets
+
+def aggregate_room_stats(db: Session, room_id: int):
+    rows = db.query(
+        models.Answer.question_id,
+        models.Question.quiz_id,
+        models.Answer.is_correct,
+        models.Answer.response_time
+    ).join(models.Participant, models.Participant.id == models.Answer.participant_id).join(
+        models.Room, models.Room.id == models.Participant.room_id
+    ).join(
+        models.Question, models.Question.id == models.Answer.question_id
+    ).filter(
+        models.Participant.room_id == room_id,
+        models.Answer.round == models.Room.current_round
+    ).all()
+
+    fresh = {}
+    for question_id, quiz_id, is_correct, response_time in rows:
+        stats = fresh.get(question_id)
+        if stats is None:
+            stats = fresh[question_id] = models.RoomQuestionStats(
+                room_id=room_id, question_id=question_id, quiz_id=quiz_id,
+                answers_count=0, correct_count=0, response_time_sum=0.0,
+                response_time_buckets=[0] * RESPONSE_TIME_BUCKETS
+            )
+        stats.answers_count += 1
+        stats.correct_count += 1 if is_correct else 0
+        stats.response_time_sum += response_time or 0.0
+        stats.response_time_buckets[_response_time_bucket(response_time)] += 1
+
+    previous = {r.question_id: r for r in db.query(models.RoomQuestionStats).filter(
+        models.RoomQuestionStats.room_id == room_id
+    ).all()}
+    if not fresh:
+        return
+    question_ids = set(fresh) | set(previous)
+
+    question_stats = {q.question_id: q for q in db.query(models.QuestionStats).filter(
+        models.QuestionStats.question_id.in_(question_ids)
+    ).all()}
+    quiz_ids = set()
+    new_play_quiz_ids = {s.quiz_id for s in fresh.values()} - {s.quiz_id for s in previous.values()}
+
+    for question_id in question_ids:
+        new, old = fresh.get(question_id), previous.get(question_id)
+        quiz_id = (new or old).quiz_id
+        quiz_ids.add(quiz_id)
+
+        target = question_stats.get(question_id)
+        if target is None:
+            target = question_stats[question_id] = models.QuestionStats(question_id=question_id, quiz_id=quiz_id, plays=0)
+            db.add(target)
+
+        if old:
+            _apply_stats(target, old, -1)
+            target.plays -= 1
+        if new:
+            _apply_stats(target, new, 1)
+            target.plays += 1
+            if old:
+                old.answers_count = new.answers_count
+                old.correct_count = new.correct_count
+                old.response_time_sum = new.response_time_sum
+                old.response_time_buckets = new.response_time_buckets
+            else:
+                db.add(new)
+        else:
+            db.delete(old)
+
+        answered = target.answers_count
+        target.correct_rate = target.correct_count / answered if answered else 0.0
+        target.avg_response_time = target.response_time_sum / answered if answered else 0.0
+        target.median_response_time = _median_from_buckets(target.response_time_buckets, answered)
+
+    db.flush()
+
+    for quiz_id in quiz_ids:
+        per_question = db.query(models.QuestionStats).filter(models.QuestionStats.quiz_id == quiz_id).all()
+        quiz_stats = db.query(models.QuizStats).filter(models.QuizStats.quiz_id == quiz_id).first()
+        if quiz_stats is None:
+            quiz_stats = models.QuizStats(quiz_id=quiz_id, plays=0)
+            db.add(quiz_stats)
+        if quiz_id in new_play_quiz_ids:
+            quiz_stats.plays += 1
+
+        answered = sum(q.answers_count for q in per_question)
+        quiz_stats.answers_count = answered
+        quiz_stats.correct_count = sum(q.correct_count for q in per_question)
+        quiz_stats.correct_rate = quiz_stats.correct_count / answered if answered else 0.0
+        quiz_stats.avg_response_time = sum(q.response_time_sum for q in per_question) / answered if answered else 0.0
+        hardest = sorted((q for q in per_question if q.answers_count), key=lambda q: (q.correct_rate, q.question_id))
+        quiz_stats.hardest_question_ids = [q.question_id for q in hardest[:HARDEST_QUESTIONS_LIMIT]]
+        quiz_stats.updated_at = datetime.datetime.utcnow()
+
+    db.commit()
+
+def get_quiz_stats(db: Session, quiz_id: int):
+    quiz_stats = db.query(models.QuizStats).filter(models.QuizStats.quiz_id == quiz_id).first()
+    rows = db.query(models.QuestionStats, models.Question.text).join(
+        models.Question, models.Question.id == models.QuestionStats.question_id
+    ).filter(models.QuestionStats.quiz_id == quiz_id).all()
+
+    questions = {
+        q.question_id: schemas.QuestionStatsResponse(
+            question_id=q.question_id,
+            text=text,
+            plays=q.plays,
+            answers_count=q.answers_count,
+            correct_rate=q.correct_rate,
+            avg_response_time=q.avg_response_time,
+            median_response_time=q.median_response_time
+        )
+        for q, text in rows
+    }
+
+    if quiz_stats is None:
+        return schemas.QuizStatsResponse(quiz_id=quiz_id)
+
+    return schemas.QuizStatsResponse(
+        quiz_id=quiz_id,
+        plays=quiz_stats.plays,
+        answers_count=quiz_stats.answers_count,
+        correct_rate=quiz_stats.correct_rate,
+        avg_response_time=quiz_stats.avg_response_time,
+        questions=list(questions.values()),
+        hardest_questions=[questions[qid] for qid in quiz_stats.hardest_question_ids or [] if qid in questions]
+    )
+
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -8,25 +8,44 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "sqlite:///./quiz.db"  
 )
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
 if "postgresql" in SQLALCHEMY_DATABASE_URL:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=False)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=False,
+                           pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 elif "sqlite" in SQLALCHEMY_DATABASE_URL:
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
         connect_args={"check_same_thread": False},
-        echo=False
+        echo=False,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
     )
 else:
     engine = create_engine(
         "sqlite:///./quiz.db",
         connect_args={"check_same_thread": False},
-        echo=False
+        echo=False,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
     )
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_incremental_vacuum(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def game_session():
+    # one short unit of work per websocket action; objects stay readable after commit
+    return SessionLocal(expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -1,11 +1,16 @@
+import asyncio
 import uuid
 import os
-from typing import Dict, List
+from typing import List
 from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 
-import models, schemas, auth, database, crud
+import models, schemas, auth, database, crud, rescoring, scoring, maintenance, metrics, querybudget
+from profiler import SamplingProfiler
+from answer_queue import AnswerQueue
+from rooms import ConnectionManager
 
 app = FastAPI(title="MyQuiz Clone API", version="1.0.0")
 
@@ -16,8 +21,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(querybudget.QueryBudgetMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 models.Base.metadata.create_all(bind=database.engine)
+metrics.instrument_engine(database.engine)
+querybudget.instrument_engine(database.engine)
 
 @app.on_event("startup")
 def seed_categories():
@@ -69,6 +78,7 @@ def update_user_me(user_data: schemas.UserUpdate,
     return crud.update_user(db, current_user.id, user_data)
 
 @app.get("/users/me/history", response_model=List[schemas.HistoryEntry])
+@querybudget.budget(4)
 def read_history_me(db: Session = Depends(database.get_db),
                     current_user: models.User = Depends(auth.get_current_user)):
     return crud.get_history(db, current_user.id)
@@ -84,6 +94,7 @@ def reset_password(data: schemas.UserCreate, db: Session = Depends(database.get_
     return {"message": "Password updated successfully"}
 
 @app.get("/categories", response_model=List[schemas.CategoryResponse])
+@querybudget.budget(1)
 def get_categories(db: Session = Depends(database.get_db)):
     return crud.get_categories(db)
 
@@ -147,10 +158,23 @@ def add_question(quiz_id: int, q: schemas.QuestionCreate, db: Session = Depends(
 
 
 @app.get("/quizzes/{quiz_id}/questions", response_model=List[schemas.QuestionResponse])
+@querybudget.budget(2)
 def get_questions(quiz_id: int, db: Session = Depends(database.get_db)):
     return crud.get_questions_for_quiz(db, quiz_id)
 
 
+@app.get("/quizzes/{quiz_id}/stats", response_model=schemas.QuizStatsResponse)
+def get_quiz_stats(quiz_id: int, db: Session = Depends(database.get_db),
+                   current_user: models.User = Depends(auth.get_current_user)):
+    quiz = crud.get_quiz(db, quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    if quiz.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view stats for this quiz")
+    
+    return crud.get_quiz_stats(db, quiz_id)
+
+
 @app.put("/questions/{question_id}", response_model=schemas.QuestionResponse)
 def update_question(question_id: int, q: schemas.QuestionUpdate, db: Session = Depends(database.get_db),
                    current_user: models.User = Depends(auth.get_current_user)):
@@ -195,12 +219,13 @@ def create_room(quiz_id: int, db: Session = Depends(database.get_db),
 
 
 @app.get("/rooms/{room_code}")
+@querybudget.budget(2)
 def get_room_info(room_code: str, db: Session = Depends(database.get_db)):
     room = crud.get_room(db, room_code)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    approved_count = sum(1 for p in room.participants if p.is_approved)
+    approved_count = crud.count_approved_participants(db, room.id)
     
     return {
         "room_code": room.code,
@@ -211,6 +236,7 @@ def get_room_info(room_code: str, db: Session = Depends(database.get_db)):
 
 
 @app.get("/rooms/{room_code}/leaderboard")
+@querybudget.budget(2)
 def get_leaderboard(room_code: str, db: Session = Depends(database.get_db)):
     room = crud.get_room(db, room_code)
     if not room:
@@ -219,6 +245,21 @@ def get_leaderboard(room_code: str, db: Session = Depends(database.get_db)):
     return {"leaderboard": crud.get_leaderboard(db, room.id)}
 
 
+@app.post("/rooms/{room_code}/rescore")
+def rescore_room(room_code: str, db: Session = Depends(database.get_db),
+                 current_user: models.User = Depends(auth.get_current_user)):
+    room = crud.get_room(db, room_code)
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.quiz.creator_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to rescore this room")
+    
+    result = rescoring.rescore_room(db, room.id)
+    if db.query(models.RoomQuestionStats).filter(models.RoomQuestionStats.room_id == room.id).first():
+        crud.aggregate_room_stats(db, room.id)
+    return {**result, "leaderboard": crud.get_leaderboard(db, room.id)}
+
+
 @app.get("/rooms/{room_code}/host-quizzes", response_model=List[schemas.QuizResponse])
 def get_host_quizzes(room_code: str, db: Session = Depends(database.get_db),
                      current_user: models.User = Depends(auth.get_current_user)):
@@ -234,264 +275,337 @@ def get_host_quizzes(room_code: str, db: Session = Depends(database.get_db),
 
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.room_hosts: Dict[str, WebSocket] = {}
+manager = ConnectionManager()
+metrics.room_sockets.set_function(manager.socket_counts)
+profiler = SamplingProfiler()
+answer_queue = AnswerQueue()
 
-    async def connect(self, websocket: WebSocket, room_code: str, is_host: bool):
-        await websocket.accept()
-        if room_code not in self.active_connections:
-            self.active_connections[room_code] = []
-        
-        if is_host:
-            self.room_hosts[room_code] = websocket
-        else:
-            self.active_connections[room_code].append(websocket)
 
-    def disconnect(self, websocket: WebSocket, room_code: str, is_host: bool):
-        if is_host:
-            if room_code in self.room_hosts:
-                del self.room_hosts[room_code]
-        else:
-            if room_code in self.active_connections:
-                try:
-                    self.active_connections[room_code].remove(websocket)
-                except ValueError:
-                    pass
-
-    async def broadcast(self, room_code: str, message: dict, exclude_host: bool = False):
-        if room_code in self.active_connections:
-            for connection in self.active_connections[room_code]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
-        
-        if not exclude_host and room_code in self.room_hosts:
-            try:
-                await self.room_hosts[room_code].send_json(message)
-            except:
-                pass
-
-    async def send_to_host(self, room_code: str, message: dict):
-        if room_code in self.room_hosts:
-            try:
-                await self.room_hosts[room_code].send_json(message)
-            except:
-                pass
+@app.on_event("startup")
+async def start_maintenance():
+    if maintenance.MAINTENANCE_ENABLED:
+        app.state.maintenance_task = asyncio.create_task(maintenance.run_forever(manager, answer_queue))
 
 
-manager = ConnectionManager()
+@app.on_event("shutdown")
+async def stop_maintenance():
+    task = getattr(app.state, "maintenance_task", None)
+    if task:
+        task.cancel()
+
+
+WS_ACTIONS = {
+    "approve_player", "reject_player", "start_quiz", "next_question", "pause_quiz", "resume_quiz",
+    "finish_quiz", "change_quiz", "show_leaderboard", "join_room", "submit_answer"
+}
+WS_QUERY_BUDGETS = {"submit_answer": 0, "join_room": 6, "approve_player": 6}
 
 
 @app.websocket("/ws/{room_code}/{role}")
 async def websocket_endpoint(websocket: WebSocket, room_code: str, role: str):
+    if role == "spectator":
+        if not await manager.connect_spectator(websocket, room_code):
+            return
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            manager.disconnect_spectator(websocket, room_code)
+        return
+
     is_host = (role == "host")
-    await manager.connect(websocket, room_code, is_host)
+    if not await manager.connect(websocket, room_code, is_host):
+        return
     
-    db: Session = database.SessionLocal()
     try:
         while True:
             data = await websocket.receive_json()
             action = data.get("action")
 
-            if is_host:
-                if action == "approve_player":
-                    participant_id = data.get("participant_id")
-                    crud.update_participant_approval(db, participant_id, True)
+            action_label = action if action in WS_ACTIONS else "unknown"
+            with metrics.ws_action_duration.time("host" if is_host else "player", action_label), \
+                    querybudget.track(f"WS {action_label}", WS_QUERY_BUDGETS.get(action_label)), \
+                    database.game_session() as db:
+                if is_host:
+                    if action == "approve_player":
+                        participant_id = data.get("participant_id")
+                        crud.update_participant_approval(db, participant_id, True)
                     
-                    await manager.broadcast(room_code, {
-                        "event": "player_approved",
-                        "participant_id": participant_id
-                    })
+                        await manager.broadcast(room_code, {
+                            "event": "player_approved",
+                            "participant_id": participant_id
+                        })
                     
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        approved_count = sum(1 for p in room.participants if p.is_approved)
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            approved_count = crud.count_approved_participants(db, room.id)
+                            await manager.broadcast(room_code, {
+                                "event": "participants_update",
+                                "count": approved_count
+                            })
+
+                    elif action == "reject_player":
+                        participant_id = data.get("participant_id")
                         await manager.broadcast(room_code, {
-                            "event": "participants_update",
-                            "count": approved_count
+                            "event": "player_rejected",
+                            "participant_id": participant_id
                         })
 
-                elif action == "reject_player":
-                    participant_id = data.get("participant_id")
-                    await manager.broadcast(room_code, {
-                        "event": "player_rejected",
-                        "participant_id": participant_id
-                    })
-
-                elif action == "start_quiz":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        crud.reset_room_scores(db, room.id)
-                        crud.update_room_status(db, room_code, "active")
-                        quiz = room.quiz
-                        if quiz.questions:
-                            current_question = quiz.questions[0]
-                            await manager.broadcast(room_code, {
-                                "event": "quiz_started",
-                                "question": {
+                    elif action == "start_quiz":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            scoring_config = data.get("scoring")
+                            if scoring_config is not None:
+                                room.scoring_mode = scoring_config.get("mode", "classic")
+                                room.scoring_params = {k: v for k, v in scoring_config.items() if k != "mode"}
+                            try:
+                                strategy = scoring.resolve(room.scoring_mode, room.scoring_params)
+                            except ValueError as exc:
+                                db.rollback()
+                                await manager.send_personal(room_code, websocket, {"event": "error", "detail": str(exc)})
+                                continue
+                            answer_queue.configure(room_code, scoring.RoomScorer(strategy))
+                            crud.reset_room_scores(db, room.id)
+                            crud.update_room_status(db, room_code, "active")
+                            quiz = room.quiz
+                            state = manager.room_state(room_code)
+                            state.set_status("active")
+                            if quiz.questions:
+                                current_question = quiz.questions[0]
+                                question = {
                                     "id": current_question.id,
                                     "text": current_question.text,
                                     "timer_seconds": current_question.timer_seconds,
+                                    "question_type": current_question.question_type,
                                     "choices": [
                                         {"id": c.id, "text": c.text}
                                         for c in current_question.choices
                                     ]
                                 }
-                            })
+                                state.set_question(question)
+                                await manager.broadcast(room_code, {
+                                    "event": "quiz_started",
+                                    "question": question
+                                })
                 
-                elif action == "next_question":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        quiz = room.quiz
-                        current_idx = room.current_question_index
+                    elif action == "next_question":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            quiz = room.quiz
+                            current_idx = room.current_question_index
                         
-                        leaderboard = crud.get_leaderboard(db, room.id)
-                        await manager.broadcast(room_code, {
-                            "event": "show_results",
-                            "leaderboard": [l.dict() for l in leaderboard]
-                        })
+                            state = manager.room_state(room_code)
+                            closed = state.close_question()
+                            if closed:
+                                crud.save_answer_distribution(db, room.id, *closed)
                         
-                        if current_idx + 1 < len(quiz.questions):
-                            room.current_question_index = current_idx + 1
-                            db.commit()
-                            next_question = quiz.questions[current_idx + 1]
+                            leaderboard = [l.dict() for l in crud.get_leaderboard(db, room.id)]
+                            state.set_leaderboard(leaderboard)
                             await manager.broadcast(room_code, {
-                                "event": "next_question",
-                                "question": {
+                                "event": "show_results",
+                                "leaderboard": leaderboard
+                            })
+                        
+                            if current_idx + 1 < len(quiz.questions):
+                                room.current_question_index = current_idx + 1
+                                db.commit()
+                                next_question = quiz.questions[current_idx + 1]
+                                question = {
                                     "id": next_question.id,
                                     "text": next_question.text,
                                     "timer_seconds": next_question.timer_seconds,
+                                    "question_type": next_question.question_type,
                                     "choices": [
                                         {"id": c.id, "text": c.text}
                                         for c in next_question.choices
                                     ]
                                 }
+                                state.set_question(question)
+                                await manager.broadcast(room_code, {
+                                    "event": "next_question",
+                                    "question": question
+                                })
+                            else:
+                                crud.aggregate_room_stats(db, room.id)
+                                state.set_status("finished")
+                                await manager.broadcast(room_code, {"event": "quiz_finished"})
+                
+                    elif action == "pause_quiz":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            crud.update_room_status(db, room_code, "paused")
+                            manager.room_state(room_code).set_status("paused")
+                            await manager.broadcast(room_code, {
+                                "event": "quiz_paused",
+                                "message": "Викторина на паузе"
                             })
-                        else:
-                            await manager.broadcast(room_code, {"event": "quiz_finished"})
                 
-                elif action == "pause_quiz":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        crud.update_room_status(db, room_code, "paused")
-                        await manager.broadcast(room_code, {
-                            "event": "quiz_paused",
-                            "message": "Викторина на паузе"
-                        })
+                    elif action == "resume_quiz":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            crud.update_room_status(db, room_code, "active")
+                            manager.room_state(room_code).set_status("active")
+                            await manager.broadcast(room_code, {
+                                "event": "quiz_resumed",
+                                "message": "Викторина продолжается"
+                            })
                 
-                elif action == "resume_quiz":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        crud.update_room_status(db, room_code, "active")
-                        await manager.broadcast(room_code, {
-                            "event": "quiz_resumed",
-                            "message": "Викторина продолжается"
-                        })
+                    elif action == "finish_quiz":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            crud.update_room_status(db, room_code, "waiting_for_next")
+                            state = manager.room_state(room_code)
+                            closed = state.close_question()
+                            if closed:
+                                crud.save_answer_distribution(db, room.id, *closed)
+                            crud.aggregate_room_stats(db, room.id)
+                            leaderboard = [l.dict() for l in crud.get_leaderboard(db, room.id)]
+                            state.set_status("waiting_for_next")
+                            state.set_leaderboard(leaderboard)
+                            await manager.broadcast(room_code, {
+                                "event": "quiz_finished",
+                                "leaderboard": leaderboard
+                            })
                 
-                elif action == "finish_quiz":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        crud.update_room_status(db, room_code, "waiting_for_next")
-                        leaderboard = crud.get_leaderboard(db, room.id)
-                        await manager.broadcast(room_code, {
-                            "event": "quiz_finished",
-                            "leaderboard": [l.dict() for l in leaderboard]
-                        })
+                    elif action == "change_quiz":
+                        new_quiz_id = data.get("quiz_id")
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            quiz = crud.get_quiz(db, new_quiz_id)
+                            if quiz:
+                                room.quiz_id = new_quiz_id
+                                room.current_question_index = 0
+                                room.status = "waiting"
+                                crud.reset_room_scores(db, room.id)
+                                db.commit()
+                                manager.room_state(room_code).reset()
+                                await manager.broadcast(room_code, {
+                                    "event": "quiz_changed",
+                                    "quiz_id": new_quiz_id,
+                                    "quiz_title": quiz.title
+                                })
                 
-                elif action == "change_quiz":
-                    new_quiz_id = data.get("quiz_id")
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        quiz = crud.get_quiz(db, new_quiz_id)
-                        if quiz:
-                            room.quiz_id = new_quiz_id
-                            room.current_question_index = 0
-                            room.status = "waiting"
-                            crud.reset_room_scores(db, room.id)
-                            db.commit()
+                    elif action == "show_leaderboard":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            leaderboard = [l.dict() for l in crud.get_leaderboard(db, room.id)]
+                            manager.room_state(room_code).set_leaderboard(leaderboard)
                             await manager.broadcast(room_code, {
-                                "event": "quiz_changed",
-                                "quiz_id": new_quiz_id,
-                                "quiz_title": quiz.title
+                                "event": "leaderboard",
+                                "leaderboard": leaderboard
                             })
-                
-                elif action == "show_leaderboard":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        leaderboard = crud.get_leaderboard(db, room.id)
-                        await manager.broadcast(room_code, {
-                            "event": "leaderboard",
-                            "leaderboard": [l.dict() for l in leaderboard]
-                        })
             
-            else:  
-                if action == "join_room":
-                    room = crud.get_room(db, room_code)
-                    if room:
-                        user_id = data.get("user_id")
-                        nickname = data.get("nickname")
-                        participant = crud.add_participant(db, room.id, user_id, is_approved=False, nickname=nickname)
+                else:  
+                    if action == "join_room":
+                        room = crud.get_room(db, room_code)
+                        if room:
+                            user_id = data.get("user_id")
+                            nickname = data.get("nickname")
+                            participant = crud.add_participant(db, room.id, user_id, is_approved=False, nickname=nickname)
                         
-                        if nickname:
-                            display_name = nickname
-                        else:
-                            user = db.query(models.User).filter(models.User.id == user_id).first() if user_id else None
-                            display_name = user.username if user else f"Player {user_id}"
-
-                        await manager.send_to_host(room_code, {
-                            "event": "player_request",
-                            "participant": {
-                                "id": participant.id,
-                                "username": display_name,
-                                "user_id": user_id
-                            }
-                        })
+                            if nickname:
+                                display_name = nickname
+                            else:
+                                user = db.query(models.User).filter(models.User.id == user_id).first() if user_id else None
+                                display_name = user.username if user else f"Player {user_id}"
+
+                            await manager.send_to_host(room_code, {
+                                "event": "player_request",
+                                "participant": {
+                                    "id": participant.id,
+                                    "username": display_name,
+                                    "user_id": user_id
+                                }
+                            })
                         
-                        await websocket.send_json({
-                            "event": "waiting_approval",
-                            "participant_id": participant.id
-                        })
+                            await manager.send_personal(room_code, websocket, {
+                                "event": "waiting_approval",
+                                "participant_id": participant.id
+                            })
                 
-                elif action == "submit_answer":
-                    participant_id = data.get("participant_id")
-                    question_id = data.get("question_id")
-                    choice_id = data.get("choice_id")
-                    response_time = data.get("response_time", 0)
+                    elif action == "submit_answer":
+                        participant_id = data.get("participant_id")
+                        question_id = data.get("question_id")
+                        choice_ids = data.get("choice_ids")
+                        if choice_ids is None:
+                            choice_ids = [data.get("choice_id")]
+                        if not isinstance(choice_ids, list):
+                            choice_ids = []
+                        choice_ids = [c for c in choice_ids if isinstance(c, int)]
+                        response_time = data.get("response_time", 0)
                     
-                    score = crud.process_answer(
-                        db,
-                        participant_id=participant_id,
-                        question_id=question_id,
-                        choice_id=choice_id,
-                        response_time=response_time
-                    )
+                        score, is_correct = await answer_queue.submit(
+                            room_code,
+                            participant_id=participant_id,
+                            question_id=question_id,
+                            choice_ids=choice_ids,
+                            response_time=response_time
+                        )
                     
-                    choice = db.query(models.Choice).filter(models.Choice.id == choice_id).first()
+                        if manager.room_state(room_code).record_answer(participant_id, question_id, choice_ids):
+                            manager.push_answer_stats(room_code)
                     
-                    await websocket.send_json({
-                        "event": "answer_result",
-                        "score_earned": score,
-                        "is_correct": choice.is_correct if choice else False
-                    })
+                        await manager.send_personal(room_code, websocket, {
+                            "event": "answer_result",
+                            "score_earned": score,
+                            "is_correct": is_correct
+                        })
     
     except WebSocketDisconnect:
         manager.disconnect(websocket, room_code, is_host)
         if is_host:
             await manager.broadcast(room_code, {"event": "host_disconnected"})
         else:
-            room = crud.get_room(db, room_code)
+            with database.game_session() as db:
+                room = crud.get_room(db, room_code)
+                participants_count = len(room.participants) - 1 if room else None
             if room:
                 await manager.send_to_host(room_code, {
                     "event": "player_left",
-                    "participants_count": len(room.participants) - 1
+                    "participants_count": participants_count
                 })
-    finally:
-        db.close()
 
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def read_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/internal/stats", dependencies=[Depends(auth.require_admin)])
+def internal_stats():
+    return manager.stats()
+
+
+@app.post("/internal/profiler/start", dependencies=[Depends(auth.require_admin)])
+def start_profiler(options: schemas.ProfilerStart):
+    try:
+        profiler.start(options.room_code, options.seconds, options.interval_ms)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return profiler.status()
+
+
+@app.get("/internal/profiler", dependencies=[Depends(auth.require_admin)])
+def profiler_status():
+    return profiler.status()
+
+
+@app.post("/internal/profiler/stop", dependencies=[Depends(auth.require_admin)])
+def stop_profiler():
+    return Response(profiler.stop(), media_type="text/plain")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("API_HOST", "0.0.0.0"),
+        port=int(os.getenv("API_PORT", "8000")),
+        reload=os.getenv("API_RELOAD", "false").lower() == "true",
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true",
+    )
@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import logging
+import os
+from typing import Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models, database, crud
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+ROOM_IDLE_TIMEOUT_MINUTES = float(os.getenv("ROOM_IDLE_TIMEOUT_MINUTES", "120"))
+ANSWER_RETENTION_DAYS = float(os.getenv("ANSWER_RETENTION_DAYS", "30"))
+MAINTENANCE_BATCH_ROOMS = int(os.getenv("MAINTENANCE_BATCH_ROOMS", "50"))
+SQLITE_VACUUM_PAGES = int(os.getenv("SQLITE_VACUUM_PAGES", "1000"))
+
+LIVE_STATUSES = ("waiting", "active", "paused", "waiting_for_next")
+
+logger = logging.getLogger(__name__)
+
+
+def expire_idle_rooms(db: Session, idle_minutes: float, connected_codes: Iterable[str] = ()) -> List[str]:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(minutes=idle_minutes)
+    query = db.query(models.Room.id, models.Room.code).filter(
+        models.Room.status.in_(LIVE_STATUSES),
+        models.Room.updated_at < cutoff
+    )
+    connected_codes = list(connected_codes)
+    if connected_codes:
+        query = query.filter(models.Room.code.notin_(connected_codes))
+    rooms = query.all()
+    if rooms:
+        db.query(models.Room).filter(models.Room.id.in_([r.id for r in rooms])).update(
+            {"status": "expired"}, synchronize_session=False
+        )
+        db.commit()
+    return [r.code for r in rooms]
+
+
+def archive_old_answers(db: Session, retention_days: float, batch_rooms: int) -> int:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    room_ids = [room_id for (room_id,) in db.query(models.Room.id).filter(
+        models.Room.created_at < cutoff,
+        models.Room.status.notin_(LIVE_STATUSES),
+        db.query(models.Answer.id).join(models.Participant).filter(
+            models.Participant.room_id == models.Room.id
+        ).exists()
+    ).limit(batch_rooms).all()]
+
+    for room_id in room_ids:
+        crud.aggregate_room_stats(db, room_id)
+        participant_ids = db.query(models.Participant.id).filter(models.Participant.room_id == room_id)
+        db.query(models.Answer).filter(models.Answer.participant_id.in_(participant_ids.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    return len(room_ids)
+
+
+def incremental_vacuum(db: Session, pages: int) -> bool:
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    if db.execute(text("PRAGMA auto_vacuum")).scalar() != 2:
+        return False
+    db.execute(text(f"PRAGMA incremental_vacuum({int(pages)})"))
+    db.commit()
+    return True
+
+
+def run_database_maintenance(connected_codes: Iterable[str] = (), session_factory=None) -> dict:
+    db = (session_factory or database.SessionLocal)()
+    try:
+        expired = expire_idle_rooms(db, ROOM_IDLE_TIMEOUT_MINUTES, connected_codes)
+        archived = archive_old_answers(db, ANSWER_RETENTION_DAYS, MAINTENANCE_BATCH_ROOMS)
+        vacuumed = incremental_vacuum(db, SQLITE_VACUUM_PAGES)
+        return {"expired_rooms": expired, "archived_rooms": archived, "vacuumed": vacuumed}
+    finally:
+        db.close()
+
+
+def release_idle_rooms(manager, answer_queue, idle_seconds: float) -> List[str]:
+    codes = manager.idle_rooms(idle_seconds)
+    for code in codes:
+        manager.release(code)
+        answer_queue.discard(code)
+    return codes
+
+
+async def run_forever(manager, answer_queue, interval: float = MAINTENANCE_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            released = release_idle_rooms(manager, answer_queue, ROOM_IDLE_TIMEOUT_MINUTES * 60)
+            result = await asyncio.to_thread(run_database_maintenance, manager.connected_rooms())
+            for code in result["expired_rooms"]:
+                manager.release(code)
+                answer_queue.discard(code)
+            logger.info("maintenance: released %d idle rooms, expired %d, archived answers of %d",
+                        len(released), len(result["expired_rooms"]), result["archived_rooms"])
+        except Exception:
+            logger.exception("maintenance run failed")
@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+INF_LABEL = 'le="+Inf"'
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                # per-bucket counts, then sum and count
+                series = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def collect(self) -> Iterable[str]:
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labels, label_values, INF_LABEL)} {int(series[-1])}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {int(series[-1])}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def collect(self) -> Iterable[str]:
+        with self.lock:
+            snapshot = dict(self.series)
+        for label_values, value in sorted(snapshot.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.callback = callback
+
+    def collect(self) -> Iterable[str]:
+        if self.callback is None:
+            return
+        for label_values, value in sorted(self.callback().items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+http_request_duration = Histogram(
+    "myquiz_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"))
+ws_action_duration = Histogram(
+    "myquiz_ws_action_duration_seconds", "WebSocket action handling latency.", ("role", "action"))
+broadcast_duration = Histogram(
+    "myquiz_broadcast_duration_seconds", "Time to encode and fan out one room broadcast.")
+broadcast_recipients = Counter(
+    "myquiz_broadcast_recipients_total", "Frames queued by room broadcasts.")
+room_sockets = Gauge(
+    "myquiz_room_connected_sockets", "Connected sockets per room.", ("room", "role"))
+db_query_duration = Histogram(
+    "myquiz_db_query_duration_seconds", "SQL statement execution time by statement type.",
+    ("operation",), QUERY_BUCKETS)
+password_hash_duration = Histogram(
+    "myquiz_password_hash_duration_seconds", "Argon2 hash and verify time.", ("operation",), HASH_BUCKETS)
+
+REGISTRY = [
+    http_request_duration,
+    ws_action_duration,
+    broadcast_duration,
+    broadcast_recipients,
+    room_sockets,
+    db_query_duration,
+    password_hash_duration,
+]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine):
+    if getattr(engine, "_myquiz_metrics", False):
+        return
+    engine._myquiz_metrics = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("myquiz_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["myquiz_query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_duration.observe(time.perf_counter() - started, operation)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], path, str(status["code"]))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Float, Text, UniqueConstraint, JSON
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -66,7 +66,11 @@ class Room(Base):
     quiz_id = Column(Integer, ForeignKey("quizzes.id"))
     status = Column(String, default="waiting")  
     current_question_index = Column(Integer, default=0)
+    current_round = Column(Integer, default=1)
+    scoring_mode = Column(String, default="classic")
+    scoring_params = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
     
     quiz = relationship("Quiz", back_populates="rooms")
     participants = relationship("Participant", back_populates="room", cascade="all, delete")
@@ -76,7 +80,7 @@ class Participant(Base):
     __tablename__ = "participants"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"))
+    room_id = Column(Integer, ForeignKey("rooms.id"), index=True)
     score = Column(Float, default=0.0)
     joined_at = Column(DateTime, default=datetime.datetime.utcnow)
     is_approved = Column(Boolean, default=False)
@@ -89,13 +93,67 @@ class Participant(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (UniqueConstraint("participant_id", "question_id", "round", name="uq_answers_participant_question_round"),)
     id = Column(Integer, primary_key=True, index=True)
     participant_id = Column(Integer, ForeignKey("participants.id"))
     question_id = Column(Integer, ForeignKey("questions.id"))
-    choice_id = Column(Integer, ForeignKey("choices.id"))
+    choice_id = Column(Integer, ForeignKey("choices.id"), nullable=True)
+    choice_ids = Column(JSON, nullable=True)
     response_time = Column(Float)  
     is_correct = Column(Boolean, default=False)
     points = Column(Float, default=0.0)
+    round = Column(Integer, default=1)
     answered_at = Column(DateTime, default=datetime.datetime.utcnow)
     
-    participant = relationship("Participant", back_populates="answers")
\ No newline at end of file
+    participant = relationship("Participant", back_populates="answers")
+
+
+class AnswerDistribution(Base):
+    __tablename__ = "answer_distributions"
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
+    choice_id = Column(Integer, ForeignKey("choices.id"))
+    count = Column(Integer, default=0)
+
+
+class RoomQuestionStats(Base):
+    __tablename__ = "room_question_stats"
+    __table_args__ = (UniqueConstraint("room_id", "question_id", name="uq_room_question_stats_room_question"),)
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), index=True)
+    answers_count = Column(Integer, default=0)
+    correct_count = Column(Integer, default=0)
+    response_time_sum = Column(Float, default=0.0)
+    response_time_buckets = Column(JSON)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+
+class QuestionStats(Base):
+    __tablename__ = "question_stats"
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), index=True)
+    plays = Column(Integer, default=0)
+    answers_count = Column(Integer, default=0)
+    correct_count = Column(Integer, default=0)
+    response_time_sum = Column(Float, default=0.0)
+    response_time_buckets = Column(JSON)
+    correct_rate = Column(Float, default=0.0)
+    avg_response_time = Column(Float, default=0.0)
+    median_response_time = Column(Float, default=0.0)
+
+    question = relationship("Question")
+
+
+class QuizStats(Base):
+    __tablename__ = "quiz_stats"
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), primary_key=True)
+    plays = Column(Integer, default=0)
+    answers_count = Column(Integer, default=0)
+    correct_count = Column(Integer, default=0)
+    correct_rate = Column(Float, default=0.0)
+    avg_response_time = Column(Float, default=0.0)
+    hardest_question_ids = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
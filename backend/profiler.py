@@ -0,0 +1,107 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR")
+
+TARGET_FUNCTIONS = {"websocket_endpoint"}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.samples = Counter()
+        self.room_code: Optional[str] = None
+        self.interval = PROFILER_INTERVAL_MS / 1000
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, room_code: Optional[str] = None, seconds: Optional[float] = None,
+              interval_ms: Optional[float] = None):
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        with self.lock:
+            self.samples = Counter()
+        self.room_code = room_code
+        self.interval = (interval_ms or PROFILER_INTERVAL_MS) / 1000
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + min(seconds or PROFILER_MAX_SECONDS, PROFILER_MAX_SECONDS)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="ws-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> str:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        folded = self.folded()
+        if PROFILER_OUTPUT_DIR and folded:
+            name = f"profile-{self.room_code or 'all'}-{int(time.time())}.folded"
+            with open(os.path.join(PROFILER_OUTPUT_DIR, name), "w") as output:
+                output.write(folded)
+        return folded
+
+    def status(self) -> dict:
+        with self.lock:
+            total = sum(self.samples.values())
+        return {
+            "running": self.running,
+            "room_code": self.room_code,
+            "interval_ms": self.interval * 1000,
+            "samples": total,
+            "remaining_seconds": max(0.0, self.deadline - time.monotonic()) if self.running else 0.0
+        }
+
+    def folded(self) -> str:
+        with self.lock:
+            items = sorted(self.samples.items())
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            if time.monotonic() >= self.deadline:
+                break
+            self._sample()
+
+    def _sample(self):
+        own = self.thread.ident if self.thread else None
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = self._stack(frame)
+            if stack:
+                with self.lock:
+                    self.samples[stack] += 1
+
+    def _stack(self, frame) -> Optional[str]:
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            if frame.f_code.co_name in TARGET_FUNCTIONS:
+                handler_locals = frame.f_locals
+                room_code = handler_locals.get("room_code")
+                if self.room_code is not None and room_code != self.room_code:
+                    return None
+                action = handler_locals.get("action_label") or "idle"
+                labels.append(f"action:{action}")
+                labels.append(f"room:{room_code}")
+                return ";".join(reversed(labels))
+            frame = frame.f_back
+        return None
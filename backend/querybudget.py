@@ -0,0 +1,113 @@
+import contextvars
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import event
+
+QUERY_BUDGET_ENABLED = os.getenv("QUERY_BUDGET_ENABLED", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+
+logger = logging.getLogger(__name__)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("query_tracker", default=None)
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\(\s*__\[POSTCOMPILE_\w+\]\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+violations = []
+
+
+def statement_shape(statement: str) -> str:
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryTracker:
+    def __init__(self, name: str, budget: Optional[int] = None):
+        self.name = name
+        self.budget = budget
+        self.count = 0
+        self.shapes = Counter()
+        self.active = True
+
+    def record(self, statement: str):
+        if self.active:
+            self.count += 1
+            self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+
+def budget(max_queries: int):
+    def decorate(endpoint):
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+
+def report(tracker: QueryTracker):
+    for shape, count in tracker.repeated().items():
+        logger.warning("%s: statement repeated %d times (possible N+1): %s", tracker.name, count, shape)
+    if tracker.over_budget():
+        violations.append((tracker.name, tracker.count, tracker.budget))
+        logger.warning("%s: %d queries, budget is %d", tracker.name, tracker.count, tracker.budget)
+
+
+@contextmanager
+def track(name: str, max_queries: Optional[int] = None, enabled: Optional[bool] = None):
+    if not (QUERY_BUDGET_ENABLED if enabled is None else enabled):
+        yield None
+        return
+    tracker = QueryTracker(name, max_queries)
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        tracker.active = False
+        _current.reset(token)
+        report(tracker)
+
+
+def detach():
+    _current.set(None)
+
+
+def instrument_engine(engine):
+    if getattr(engine, "_myquiz_query_budget", False):
+        return
+    engine._myquiz_query_budget = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        tracker = _current.get()
+        if tracker is not None:
+            tracker.record(statement)
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_BUDGET_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        with track(f"{scope['method']} {scope['path']}") as tracker:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    route = scope.get("route")
+                    tracker.name = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+                    tracker.budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(tracker.count).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,131 @@
+import sys
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models, database, scoring, crud
+
+
+def _running_position(keys: np.ndarray, flags: np.ndarray):
+    by_key = np.argsort(keys, kind="stable")
+    sorted_keys = keys[by_key]
+    sorted_flags = flags[by_key].astype(np.int64)
+    group_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+    return by_key, sorted_flags, group_start
+
+
+def correct_order(question_ids: np.ndarray, is_correct: np.ndarray) -> np.ndarray:
+    by_question, correct_sorted, group_start = _running_position(question_ids, is_correct)
+    running = np.cumsum(correct_sorted)
+    offsets = np.maximum.accumulate(np.where(group_start, running - correct_sorted, 0))
+    order = np.empty(len(question_ids), dtype=np.int64)
+    order[by_question] = running - offsets
+    return order
+
+
+def correct_streaks(participant_ids: np.ndarray, is_correct: np.ndarray) -> np.ndarray:
+    by_participant, correct_sorted, group_start = _running_position(participant_ids, is_correct)
+    idx = np.arange(len(participant_ids))
+    breaks = np.maximum(np.where(correct_sorted == 0, idx, -1), np.where(group_start, idx - 1, -1))
+    streak_sorted = np.where(correct_sorted == 1, idx - np.maximum.accumulate(breaks), 0)
+    streaks = np.empty(len(participant_ids), dtype=np.int64)
+    streaks[by_participant] = streak_sorted
+    return streaks
+
+
+def score_answers(question_ids: np.ndarray, is_correct: np.ndarray,
+                  response_times: np.ndarray, timers: np.ndarray,
+                  strategy: scoring.ScoringStrategy = None,
+                  participant_ids: np.ndarray = None,
+                  correctness: np.ndarray = None) -> np.ndarray:
+    # Inputs must be ordered by submission; order factor is the rank among correct answers per question.
+    if len(question_ids) == 0:
+        return np.zeros(0)
+    strategy = strategy or scoring.ScoringStrategy()
+
+    order = np.where(is_correct, correct_order(question_ids, is_correct), 0)
+    if strategy.streak_bonus:
+        streaks = correct_streaks(participant_ids, is_correct)
+    else:
+        streaks = np.zeros(len(question_ids), dtype=np.int64)
+    if correctness is None:
+        correctness = is_correct.astype(np.float64)
+    return strategy.score_arrays(correctness, order, response_times, timers, streaks)
+
+
+def rescore_room(db: Session, room_id: int):
+    room = db.query(models.Room).filter(models.Room.id == room_id).first()
+    strategy = scoring.resolve(room.scoring_mode, room.scoring_params) if room else scoring.ScoringStrategy()
+
+    rows = db.query(
+        models.Answer.id,
+        models.Answer.participant_id,
+        models.Answer.question_id,
+        models.Answer.response_time,
+        models.Answer.points,
+        models.Answer.is_correct,
+        models.Answer.choice_id,
+        models.Answer.choice_ids
+    ).join(models.Participant, models.Participant.id == models.Answer.participant_id).filter(
+        models.Participant.room_id == room_id,
+        models.Answer.round == (room.current_round if room else 1)
+    ).order_by(models.Answer.id).all()
+
+    participant_ids = [p for (p,) in db.query(models.Participant.id).filter(models.Participant.room_id == room_id).all()]
+    if not rows:
+        if participant_ids:
+            db.execute(update(models.Participant), [{"id": p, "score": 0.0} for p in participant_ids])
+            db.commit()
+        return {"answers_updated": 0, "participants_updated": len(participant_ids)}
+
+    answer_ids, answer_participants, question_ids, response_times, old_points, old_correct, choice_ids, selections = (
+        list(column) for column in zip(*rows)
+    )
+    question_keys = crud.load_question_keys(db, set(question_ids))
+    graded = [
+        scoring.choice_correctness(frozenset(selected or [choice_id]), question_keys[question_id], strategy.partial_credit)
+        if question_id in question_keys else (0.0, False)
+        for question_id, choice_id, selected in zip(question_ids, choice_ids, selections)
+    ]
+    correctness = np.array([g[0] for g in graded], dtype=np.float64)
+    is_correct = np.array([g[1] for g in graded], dtype=bool)
+    timers = np.array([question_keys[q].timer_seconds if q in question_keys else 1 for q in question_ids])
+    answer_participants = np.array(answer_participants)
+    question_ids = np.array(question_ids)
+    response_times = np.array([t or 0.0 for t in response_times], dtype=np.float64)
+    old_points = np.array([p or 0.0 for p in old_points], dtype=np.float64)
+    old_correct = np.array([bool(c) for c in old_correct])
+
+    points = score_answers(question_ids, is_correct, response_times, timers, strategy, answer_participants, correctness)
+
+    changed = np.flatnonzero((points != old_points) | (is_correct != old_correct))
+    if len(changed):
+        db.execute(update(models.Answer), [
+            {"id": answer_ids[i], "points": float(points[i]), "is_correct": bool(is_correct[i])}
+            for i in changed
+        ])
+
+    totals = dict.fromkeys(participant_ids, 0.0)
+    unique_participants, inverse = np.unique(answer_participants, return_inverse=True)
+    for participant_id, total in zip(unique_participants, np.bincount(inverse, weights=points)):
+        totals[int(participant_id)] = float(total)
+    db.execute(update(models.Participant), [{"id": p, "score": s} for p, s in totals.items()])
+    db.commit()
+
+    return {"answers_updated": int(len(changed)), "participants_updated": len(totals)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python rescoring.py ROOM_CODE")
+        sys.exit(1)
+    db = database.SessionLocal()
+    try:
+        room = db.query(models.Room).filter(models.Room.code == sys.argv[1]).first()
+        if not room:
+            print(f"room {sys.argv[1]} not found")
+            sys.exit(1)
+        print(rescore_room(db, room.id))
+    finally:
+        db.close()
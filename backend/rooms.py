@@ -0,0 +1,400 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+import metrics
+
+SPECTATOR_TICK_SECONDS = float(os.getenv("SPECTATOR_TICK_SECONDS", "1.0"))
+SPECTATOR_LEADERBOARD_SIZE = 10
+ANSWER_STATS_INTERVAL_SECONDS = float(os.getenv("ANSWER_STATS_INTERVAL_SECONDS", "0.25"))
+MAX_PLAYERS_PER_ROOM = int(os.getenv("MAX_PLAYERS_PER_ROOM", "1000"))
+MAX_ROOMS_PER_WORKER = int(os.getenv("MAX_ROOMS_PER_WORKER", "500"))
+MAX_SOCKET_QUEUED_BYTES = int(os.getenv("MAX_SOCKET_QUEUED_BYTES", str(1024 * 1024)))
+
+
+def encode_message(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class RoomState:
+    def __init__(self):
+        self.status = "waiting"
+        self.question: Optional[dict] = None
+        self.answer_counts: Dict[int, int] = {}
+        self.answered: Set[int] = set()
+        self.question_closed = False
+        self.leaderboard: List[dict] = []
+        self.version = 0
+
+    def reset(self):
+        self.status = "waiting"
+        self.question = None
+        self.answer_counts = {}
+        self.answered = set()
+        self.question_closed = False
+        self.leaderboard = []
+        self.version += 1
+
+    def set_status(self, status: str):
+        self.status = status
+        self.version += 1
+
+    def set_question(self, question: dict):
+        self.question = question
+        self.answer_counts = {c["id"]: 0 for c in question["choices"]}
+        self.answered = set()
+        self.question_closed = False
+        self.version += 1
+
+    def record_answer(self, participant_id: int, question_id: int, choice_ids: List[int]) -> bool:
+        if (not self.question or self.question_closed or self.question["id"] != question_id
+                or participant_id in self.answered):
+            return False
+        self.answered.add(participant_id)
+        for choice_id in set(choice_ids):
+            if choice_id in self.answer_counts:
+                self.answer_counts[choice_id] += 1
+        self.version += 1
+        return True
+
+    def close_question(self) -> Optional[Tuple[int, Dict[int, int]]]:
+        if not self.question or self.question_closed:
+            return None
+        self.question_closed = True
+        return self.question["id"], dict(self.answer_counts)
+
+    def answer_stats(self) -> dict:
+        return {
+            "event": "answer_stats",
+            "question_id": self.question["id"] if self.question else None,
+            "counts": self.answer_counts,
+            "total": len(self.answered)
+        }
+
+    def set_leaderboard(self, leaderboard: List[dict]):
+        self.leaderboard = leaderboard[:SPECTATOR_LEADERBOARD_SIZE]
+        self.version += 1
+
+    def memory_estimate(self) -> int:
+        return (len(encode_message(self.snapshot()).encode("utf-8"))
+                + sys.getsizeof(self.answered) + sys.getsizeof(self.answer_counts))
+
+    def snapshot(self) -> dict:
+        return {
+            "event": "spectator_update",
+            "status": self.status,
+            "question": self.question,
+            "answer_counts": self.answer_counts,
+            "answers_total": len(self.answered),
+            "leaderboard": self.leaderboard
+        }
+
+
+class Outbox:
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+        self.frames: Deque[Tuple[str, int]] = deque()
+        self.bytes = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class ConnectionManager:
+    def __init__(self, spectator_tick: float = SPECTATOR_TICK_SECONDS,
+                 stats_interval: float = ANSWER_STATS_INTERVAL_SECONDS,
+                 max_players: int = MAX_PLAYERS_PER_ROOM,
+                 max_rooms: int = MAX_ROOMS_PER_WORKER,
+                 max_queued_bytes: int = MAX_SOCKET_QUEUED_BYTES):
+        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.room_hosts: Dict[str, WebSocket] = {}
+        self.spectators: Dict[str, Dict[WebSocket, Optional[asyncio.Task]]] = {}
+        self.spectator_tickers: Dict[str, asyncio.Task] = {}
+        self.spectator_tick = spectator_tick
+        self.stats_interval = stats_interval
+        self.stats_pushes: Dict[str, asyncio.Task] = {}
+        self.stats_sent_at: Dict[str, float] = {}
+        self.rooms: Dict[str, RoomState] = {}
+        self.last_activity: Dict[str, float] = {}
+        self.max_players = max_players
+        self.max_rooms = max_rooms
+        self.max_queued_bytes = max_queued_bytes
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        self.queued_bytes: Dict[str, int] = {}
+        self.rejections: Dict[str, int] = {}
+        self.dropped: Dict[WebSocket, str] = {}
+
+    def touch(self, room_code: str):
+        self.last_activity[room_code] = time.monotonic()
+
+    def connected_rooms(self) -> Set[str]:
+        rooms = set(self.room_hosts) | set(self.spectators)
+        rooms.update(code for code, sockets in self.active_connections.items() if sockets)
+        return rooms
+
+    def idle_rooms(self, idle_seconds: float) -> List[str]:
+        cutoff = time.monotonic() - idle_seconds
+        known = set(self.active_connections) | set(self.rooms) | set(self.last_activity)
+        connected = self.connected_rooms()
+        return [code for code in known
+                if code not in connected and self.last_activity.get(code, 0.0) < cutoff]
+
+    def release(self, room_code: str):
+        for websocket in [ws for ws, outbox in self.outboxes.items() if outbox.room_code == room_code]:
+            self._discard_outbox(websocket)
+        for websocket in [ws for ws, code in self.dropped.items() if code == room_code]:
+            del self.dropped[websocket]
+        self.active_connections.pop(room_code, None)
+        self.room_hosts.pop(room_code, None)
+        for pending in self.spectators.pop(room_code, {}).values():
+            if pending:
+                pending.cancel()
+        for tasks in (self.spectator_tickers, self.stats_pushes):
+            task = tasks.pop(room_code, None)
+            if task:
+                task.cancel()
+        self.stats_sent_at.pop(room_code, None)
+        self.rooms.pop(room_code, None)
+        self.last_activity.pop(room_code, None)
+        self.queued_bytes.pop(room_code, None)
+
+    def room_state(self, room_code: str) -> RoomState:
+        if room_code not in self.rooms:
+            self.rooms[room_code] = RoomState()
+        return self.rooms[room_code]
+
+    def _rejection_reason(self, room_code: str, is_player: bool) -> Optional[str]:
+        connected = self.connected_rooms()
+        if room_code not in connected and len(connected) >= self.max_rooms:
+            return "too_many_rooms"
+        if is_player and len(self.active_connections.get(room_code, ())) >= self.max_players:
+            return "room_full"
+        return None
+
+    async def _reject(self, websocket: WebSocket, reason: str):
+        self.rejections[reason] = self.rejections.get(reason, 0) + 1
+        try:
+            await websocket.send_text(encode_message({"event": "connection_rejected", "reason": reason}))
+            await websocket.close(code=1013)
+        except:
+            pass
+
+    async def connect(self, websocket: WebSocket, room_code: str, is_host: bool) -> bool:
+        await websocket.accept()
+        reason = self._rejection_reason(room_code, not is_host)
+        if reason:
+            await self._reject(websocket, reason)
+            return False
+        self.touch(room_code)
+        if room_code not in self.active_connections:
+            self.active_connections[room_code] = []
+        
+        if is_host:
+            self.room_hosts[room_code] = websocket
+        else:
+            self.active_connections[room_code].append(websocket)
+        return True
+
+    def disconnect(self, websocket: WebSocket, room_code: str, is_host: bool):
+        self.touch(room_code)
+        self._discard_outbox(websocket)
+        self.dropped.pop(websocket, None)
+        if is_host:
+            if room_code in self.room_hosts:
+                del self.room_hosts[room_code]
+        else:
+            if room_code in self.active_connections:
+                try:
+                    self.active_connections[room_code].remove(websocket)
+                except ValueError:
+                    pass
+
+    async def connect_spectator(self, websocket: WebSocket, room_code: str) -> bool:
+        await websocket.accept()
+        reason = self._rejection_reason(room_code, False)
+        if reason:
+            await self._reject(websocket, reason)
+            return False
+        self.touch(room_code)
+        watchers = self.spectators.setdefault(room_code, {})
+        watchers[websocket] = asyncio.create_task(
+            self._send_quietly(websocket, encode_message(self.room_state(room_code).snapshot()))
+        )
+        if room_code not in self.spectator_tickers:
+            self.spectator_tickers[room_code] = asyncio.create_task(self._spectator_ticker(room_code))
+        return True
+
+    def disconnect_spectator(self, websocket: WebSocket, room_code: str):
+        self.touch(room_code)
+        watchers = self.spectators.get(room_code)
+        if watchers is None:
+            return
+        pending = watchers.pop(websocket, None)
+        if pending:
+            pending.cancel()
+        if not watchers:
+            del self.spectators[room_code]
+            ticker = self.spectator_tickers.pop(room_code, None)
+            if ticker:
+                ticker.cancel()
+
+    async def _spectator_ticker(self, room_code: str):
+        sent_version = self.room_state(room_code).version
+        while True:
+            await asyncio.sleep(self.spectator_tick)
+            state = self.room_state(room_code)
+            if state.version == sent_version:
+                continue
+            sent_version = state.version
+            frame = encode_message(state.snapshot())
+            watchers = self.spectators.get(room_code, {})
+            for websocket, pending in watchers.items():
+                if pending is None or pending.done():
+                    watchers[websocket] = asyncio.create_task(self._send_quietly(websocket, frame))
+
+    def push_answer_stats(self, room_code: str):
+        if room_code in self.stats_pushes:
+            return
+        loop = asyncio.get_running_loop()
+        delay = self.stats_sent_at.get(room_code, 0.0) + self.stats_interval - loop.time()
+        self.stats_pushes[room_code] = asyncio.create_task(self._push_answer_stats(room_code, max(delay, 0.0)))
+
+    async def _push_answer_stats(self, room_code: str, delay: float):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.stats_pushes.pop(room_code, None)
+        self.stats_sent_at[room_code] = asyncio.get_running_loop().time()
+        await self.send_to_host(room_code, self.room_state(room_code).answer_stats())
+
+    async def _send_quietly(self, websocket: WebSocket, frame: str):
+        try:
+            await websocket.send_text(frame)
+        except:
+            pass
+
+    def _enqueue(self, room_code: str, websocket: WebSocket, frame: str, size: int):
+        if websocket in self.dropped:
+            return
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            outbox = self.outboxes[websocket] = Outbox(room_code)
+        if outbox.frames and outbox.bytes + size > self.max_queued_bytes:
+            self._drop_slow_consumer(room_code, websocket)
+            return
+        outbox.frames.append((frame, size))
+        outbox.bytes += size
+        self.queued_bytes[room_code] = self.queued_bytes.get(room_code, 0) + size
+        if outbox.task is None or outbox.task.done():
+            outbox.task = asyncio.create_task(self._write(websocket, outbox))
+
+    async def _write(self, websocket: WebSocket, outbox: Outbox):
+        while outbox.frames:
+            frame, size = outbox.frames[0]
+            try:
+                await websocket.send_text(frame)
+            except:
+                self._discard_outbox(websocket)
+                return
+            outbox.frames.popleft()
+            outbox.bytes -= size
+            self.queued_bytes[outbox.room_code] -= size
+
+    def _discard_outbox(self, websocket: WebSocket):
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox is None:
+            return
+        if outbox.room_code in self.queued_bytes:
+            self.queued_bytes[outbox.room_code] -= outbox.bytes
+        outbox.frames.clear()
+        outbox.bytes = 0
+        if outbox.task and outbox.task is not asyncio.current_task():
+            outbox.task.cancel()
+
+    def _drop_slow_consumer(self, room_code: str, websocket: WebSocket):
+        self.dropped[websocket] = room_code
+        self.rejections["slow_consumer"] = self.rejections.get("slow_consumer", 0) + 1
+        self._discard_outbox(websocket)
+        asyncio.create_task(self._close_quietly(websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)
+        except:
+            pass
+
+    async def flush(self):
+        tasks = [outbox.task for outbox in self.outboxes.values() if outbox.task and not outbox.task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def broadcast(self, room_code: str, message: dict, exclude_host: bool = False):
+        self.touch(room_code)
+        started = time.perf_counter()
+        frame = encode_message(message)
+        size = len(frame.encode("utf-8"))
+        connections = self.active_connections.get(room_code, ())
+        for connection in connections:
+            self._enqueue(room_code, connection, frame, size)
+        recipients = len(connections)
+        
+        if not exclude_host and room_code in self.room_hosts:
+            self._enqueue(room_code, self.room_hosts[room_code], frame, size)
+            recipients += 1
+        metrics.broadcast_duration.observe(time.perf_counter() - started)
+        metrics.broadcast_recipients.inc(amount=recipients)
+        # let the writers drain before the caller fans out the next frame
+        await asyncio.sleep(0)
+
+    async def send_to_host(self, room_code: str, message: dict):
+        if room_code in self.room_hosts:
+            frame = encode_message(message)
+            self._enqueue(room_code, self.room_hosts[room_code], frame, len(frame.encode("utf-8")))
+
+    async def send_personal(self, room_code: str, websocket: WebSocket, message: dict):
+        frame = encode_message(message)
+        self._enqueue(room_code, websocket, frame, len(frame.encode("utf-8")))
+
+    def socket_counts(self) -> Dict[Tuple[str, ...], int]:
+        counts = {}
+        for code, connections in self.active_connections.items():
+            counts[(code, "player")] = len(connections)
+        for code in self.room_hosts:
+            counts[(code, "host")] = 1
+        for code, watchers in self.spectators.items():
+            counts[(code, "spectator")] = len(watchers)
+        return counts
+
+    def stats(self) -> dict:
+        codes = set(self.active_connections) | set(self.room_hosts) | set(self.spectators) | set(self.rooms)
+        rooms = {
+            code: {
+                "players": len(self.active_connections.get(code, ())),
+                "host_connected": code in self.room_hosts,
+                "spectators": len(self.spectators.get(code, ())),
+                "state_bytes": self.rooms[code].memory_estimate() if code in self.rooms else 0,
+                "queued_bytes": self.queued_bytes.get(code, 0)
+            }
+            for code in sorted(codes)
+        }
+        return {
+            "rooms": rooms,
+            "totals": {
+                "rooms": len(rooms),
+                "connected_rooms": len(self.connected_rooms()),
+                "sockets": sum(r["players"] + r["spectators"] + r["host_connected"] for r in rooms.values()),
+                "state_bytes": sum(r["state_bytes"] for r in rooms.values()),
+                "queued_bytes": sum(r["queued_bytes"] for r in rooms.values())
+            },
+            "limits": {
+                "max_players_per_room": self.max_players,
+                "max_rooms_per_worker": self.max_rooms,
+                "max_socket_queued_bytes": self.max_queued_bytes
+            },
+            "rejections": dict(self.rejections)
+        }
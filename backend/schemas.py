@@ -109,4 +109,27 @@ class HistoryEntry(BaseModel):
     date: datetime
     role: str 
     score: Optional[float] = None
-    rank: Optional[str] = None 
\ No newline at end of file
+    rank: Optional[str] = None
+
+class QuestionStatsResponse(BaseModel):
+    question_id: int
+    text: str
+    plays: int
+    answers_count: int
+    correct_rate: float
+    avg_response_time: float
+    median_response_time: float
+
+class QuizStatsResponse(BaseModel):
+    quiz_id: int
+    plays: int = 0
+    answers_count: int = 0
+    correct_rate: float = 0.0
+    avg_response_time: float = 0.0
+    questions: List[QuestionStatsResponse] = []
+    hardest_questions: List[QuestionStatsResponse] = []
+
+class ProfilerStart(BaseModel):
+    room_code: Optional[str] = None
+    seconds: Optional[float] = None
+    interval_ms: Optional[float] = None
@@ -0,0 +1,116 @@
+from typing import Callable, Dict, FrozenSet, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+
+class QuestionKey(NamedTuple):
+    timer_seconds: int
+    multiple: bool
+    choice_ids: FrozenSet[int]
+    correct_ids: FrozenSet[int]
+
+
+def choice_correctness(selected: FrozenSet[int], key: QuestionKey, partial_credit: bool):
+    if selected == key.correct_ids:
+        return 1.0, True
+    if not partial_credit or not key.multiple or not key.correct_ids:
+        return 0.0, False
+    hits = len(selected & key.correct_ids)
+    misses = len(selected) - hits
+    return max(hits - misses, 0) / len(key.correct_ids), False
+
+
+class ScoringStrategy:
+    name = "classic"
+
+    def __init__(self, max_points: float = 1000, order_multipliers: Sequence[float] = (1.0, 0.8, 0.6),
+                 default_order_multiplier: float = 0.4, time_decay: float = 0.5, grace_seconds: float = 2.0,
+                 streak_bonus: float = 0, max_streak_steps: int = 5, partial_credit: bool = False):
+        self.max_points = max_points
+        self.order_multipliers = tuple(order_multipliers)
+        self.default_order_multiplier = default_order_multiplier
+        self.time_decay = time_decay
+        self.grace_seconds = grace_seconds
+        self.streak_bonus = streak_bonus
+        self.max_streak_steps = max_streak_steps
+        self.partial_credit = partial_credit
+
+    def compile(self) -> Callable[[float, int, float, float, int], int]:
+        max_points = self.max_points
+        multipliers = self.order_multipliers
+        known_orders = len(multipliers)
+        default_multiplier = self.default_order_multiplier
+        decay = self.time_decay
+        grace = self.grace_seconds
+        streak_bonus = self.streak_bonus
+        max_steps = self.max_streak_steps
+
+        def score(correctness, answer_order, response_time, timer, streak):
+            if response_time > timer + grace or correctness <= 0:
+                return 0
+            order_factor = multipliers[answer_order - 1] if answer_order <= known_orders else default_multiplier
+            effective_time = response_time if response_time < timer else timer
+            time_factor = 1 - (effective_time / timer * decay)
+            points = round(max_points * order_factor * time_factor * correctness)
+            if streak_bonus and streak > 1:
+                points += round(streak_bonus * min(streak - 1, max_steps))
+            return points
+
+        return score
+
+    def score_arrays(self, correctness: np.ndarray, answer_order: np.ndarray, response_times: np.ndarray,
+                     timers: np.ndarray, streaks: np.ndarray) -> np.ndarray:
+        timers = timers.astype(np.float64)
+        order_factor = np.full(len(answer_order), self.default_order_multiplier)
+        for i, multiplier in enumerate(self.order_multipliers):
+            order_factor[answer_order == i + 1] = multiplier
+        effective_time = np.minimum(response_times, timers)
+        time_factor = 1 - (effective_time / timers * self.time_decay)
+        points = np.round(self.max_points * order_factor * time_factor * correctness)
+        if self.streak_bonus:
+            points += np.round(self.streak_bonus * np.clip(streaks - 1, 0, self.max_streak_steps))
+        points[(correctness <= 0) | (response_times > timers + self.grace_seconds)] = 0.0
+        return points
+
+
+class FixedPointsStrategy(ScoringStrategy):
+    name = "fixed"
+
+    def __init__(self, **params):
+        params.setdefault("order_multipliers", ())
+        params.setdefault("default_order_multiplier", 1.0)
+        params.setdefault("time_decay", 0.0)
+        super().__init__(**params)
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (ScoringStrategy, FixedPointsStrategy)}
+
+
+def resolve(mode: Optional[str] = None, params: Optional[dict] = None) -> ScoringStrategy:
+    strategy = STRATEGIES.get(mode or "classic")
+    if strategy is None:
+        raise ValueError(f"Unknown scoring mode: {mode}")
+    try:
+        return strategy(**(params or {}))
+    except TypeError as exc:
+        raise ValueError(f"Invalid scoring parameters: {exc}")
+
+
+class RoomScorer:
+    def __init__(self, strategy: ScoringStrategy):
+        self.strategy = strategy
+        self.partial_credit = strategy.partial_credit
+        self.track_streaks = bool(strategy.streak_bonus)
+        self.streaks: Dict[int, int] = {}
+        self._score = strategy.compile()
+
+    def __call__(self, participant_id: int, correctness: float, answer_order: int,
+                 response_time: float, timer: float) -> int:
+        streak = 0
+        if self.track_streaks:
+            streak = self.streaks.get(participant_id, 0) + 1 if correctness >= 1 else 0
+            self.streaks[participant_id] = streak
+        return self._score(correctness, answer_order, response_time, timer, streak)
+
+
+DEFAULT_SCORER = RoomScorer(ScoringStrategy())
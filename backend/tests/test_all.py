@@ -1,8 +1,10 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, func
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from hypothesis import given, settings, strategies as st
 import sys
 import os
 
@@ -739,17 +741,17 @@ class TestScoring:
             db.add(room)
             db.commit()
             
-            participant = models.Participant(room_id=room.id, user_id=user.id)
-            db.add(participant)
+            participants = [models.Participant(room_id=room.id, user_id=user.id) for _ in range(3)]
+            db.add_all(participants)
             db.commit()
 
-            score = crud.process_answer(db, participant.id, question.id, choice.id, response_time=5.0)
+            score = crud.process_answer(db, participants[0].id, question.id, choice.id, response_time=5.0)
             assert score > 0
 
-            score_grace = crud.process_answer(db, participant.id, question.id, choice.id, response_time=11.0)
+            score_grace = crud.process_answer(db, participants[1].id, question.id, choice.id, response_time=11.0)
             assert score_grace > 0
 
-            score_late = crud.process_answer(db, participant.id, question.id, choice.id, response_time=13.0)
+            score_late = crud.process_answer(db, participants[2].id, question.id, choice.id, response_time=13.0)
             assert score_late == 0
             
         finally:
@@ -757,8 +759,8 @@ class TestScoring:
 
     def test_reset_room_scores(self, client):
         """
-        Проверка: Функция сброса очков очищает очки участников и их ответы.
-        Ожидаемый результат: Очки участника становятся 0.0, ответы удаляются.
+        Проверка: Функция сброса очков обнуляет очки и открывает новый раунд, не удаляя ответы.
+        Ожидаемый результат: Очки участника становятся 0.0, ответ прошлого раунда сохранен, на тот же вопрос можно ответить снова.
         """
         db = TestingSessionLocal()
         try:
@@ -797,13 +799,290 @@ class TestScoring:
             
             db.refresh(participant)
             assert participant.score == 0.0
+            db.refresh(room)
+            assert room.current_round == 2
             
-            ans = db.query(models.Answer).filter(models.Answer.participant_id == participant.id).first()
-            assert ans is None
+            ans = db.query(models.Answer).filter(models.Answer.participant_id == participant.id).one()
+            assert ans.round == 1
+
+            crud.reset_room_scores(db, room.id)
+            db.refresh(room)
+            assert room.current_round == 2
+
+            score = crud.process_answer(db, participant.id, question.id, choice.id, response_time=1.0)
+            assert score > 0
+            db.refresh(participant)
+            assert participant.score == score
+            rounds = [a.round for a in db.query(models.Answer).filter(models.Answer.participant_id == participant.id).order_by(models.Answer.round)]
+            assert rounds == [1, 2]
+
+        finally:
+            db.close()
+
+    def test_duplicate_answer_is_idempotent(self, client):
+        """
+        Проверка: Повторная отправка ответа на тот же вопрос (повтор клиента).
+        Ожидаемый результат: Возвращается прежний результат, ответ сохранен один раз, очки не удваиваются.
+        """
+        db = TestingSessionLocal()
+        try:
+            user = models.User(username="dup_user", hashed_password="pw")
+            db.add(user)
+            db.commit()
+
+            quiz = models.Quiz(title="Dup Quiz", creator_id=user.id)
+            db.add(quiz)
+            db.commit()
+
+            question = models.Question(text="Q1", quiz_id=quiz.id, timer_seconds=10)
+            db.add(question)
+            db.commit()
+
+            choice = models.Choice(text="Correct", is_correct=True, question_id=question.id)
+            db.add(choice)
+            db.commit()
+
+            room = models.Room(code="DUPL01", quiz_id=quiz.id)
+            db.add(room)
+            db.commit()
+
+            participant = models.Participant(room_id=room.id, user_id=user.id)
+            db.add(participant)
+            db.commit()
+
+            first = crud.process_answer(db, participant.id, question.id, choice.id, response_time=1.0)
+            retry = crud.process_answer(db, participant.id, question.id, choice.id, response_time=1.0)
+            assert retry == first
+
+            db.refresh(participant)
+            assert participant.score == first
+            assert db.query(models.Answer).filter(models.Answer.participant_id == participant.id).count() == 1
+        finally:
+            db.close()
+
+    def test_concurrent_answers_do_not_lose_points(self, tmp_path):
+        """
+        Проверка: Параллельные сессии начисляют очки одним и тем же игрокам одновременно (файл SQLite, 8 потоков).
+        Ожидаемый результат: Итоговый счет каждого игрока равен сумме очков его ответов — ни одно начисление не потеряно.
+        """
+        import threading
+
+        stress_engine = create_engine(f"sqlite:///{tmp_path / 'stress.db'}", connect_args={"check_same_thread": False, "timeout": 30})
+        Base.metadata.create_all(bind=stress_engine)
+        StressSession = sessionmaker(autocommit=False, autoflush=False, bind=stress_engine)
+
+        db = StressSession()
+        quiz = models.Quiz(title="Stress Quiz")
+        db.add(quiz)
+        db.flush()
+        questions = []
+        for i in range(40):
+            question = models.Question(text=f"Q{i}", quiz_id=quiz.id, timer_seconds=20)
+            question.choices = [models.Choice(text="A", is_correct=True), models.Choice(text="B", is_correct=False)]
+            db.add(question)
+            questions.append(question)
+        room = models.Room(code="STRESS", quiz_id=quiz.id, status="active")
+        db.add(room)
+        db.flush()
+        participants = [models.Participant(room_id=room.id, nickname=f"p{i}", is_approved=True) for i in range(4)]
+        db.add_all(participants)
+        db.commit()
+        submissions = [
+            {"participant_id": p.id, "question_id": q.id, "choice_ids": [q.choices[(p.id + q.id) % 2].id], "response_time": 1.0 + (q.id % 7)}
+            for p in participants for q in questions
+        ]
+        participant_ids = [p.id for p in participants]
+        db.close()
+
+        threads_count = 8
+        barrier = threading.Barrier(threads_count)
+        errors = []
+
+        def worker(index):
+            session = StressSession()
+            try:
+                barrier.wait()
+                for submission in submissions[index::threads_count]:
+                    crud.process_answers(session, [submission])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+        db = StressSession()
+        try:
+            assert db.query(models.Answer).count() == len(submissions)
+            for participant_id in participant_ids:
+                earned = db.query(func.sum(models.Answer.points)).filter(models.Answer.participant_id == participant_id).scalar()
+                score = db.query(models.Participant.score).filter(models.Participant.id == participant_id).scalar()
+                assert earned > 0
+                assert score == earned
+        finally:
+            db.close()
+            stress_engine.dispose()
+
+
+async def expect_event(socket, event):
+    while True:
+        message = await socket.recv()
+        if message.get("event") == event:
+            return message
+
+
+class TestGameSessions:
+    def test_memory_per_socket_flat_over_long_game(self, client, monkeypatch):
+        """
+        Проверка: Игра из 100 вопросов через WebSocket открывает короткую сессию БД на каждое действие.
+        Ожидаемый результат: Все сессии закрыты, размер identity map не растет с номером вопроса, память процесса не растет.
+        """
+        import gc
+        import tracemalloc
+        from sqlalchemy.orm import Session
+        import database
+        import main
+        from answer_queue import AnswerQueue
+        from benchmarks.load_game import AsgiSocket
+
+        identity_sizes = []
+        opened = []
+
+        class TrackingSession(Session):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                opened.append(1)
+
+            def close(self):
+                identity_sizes.append(len(self.identity_map))
+                super().close()
+
+        monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=TrackingSession))
+        monkeypatch.setattr(main, "answer_queue", AnswerQueue(batch_interval=0.001))
+
+        client.post("/register", json={"username": "long_game_host", "password": "password123"})
+        token = client.post("/login", json={"username": "long_game_host", "password": "password123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        quiz_id = client.post("/quizzes", json={"title": "Long Game"}, headers=headers).json()["id"]
+        for i in range(100):
+            client.post(f"/quizzes/{quiz_id}/questions", json={
+                "text": f"Q{i}", "timer_seconds": 20,
+                "choices": [{"text": "Yes", "is_correct": True}, {"text": "No", "is_correct": False}]
+            }, headers=headers)
+        room_code = client.post(f"/rooms/create/{quiz_id}", headers=headers).json()["code"]
+
+        async def play():
+            samples = {}
+            host = AsgiSocket(app, f"/ws/{room_code}/host")
+            player = AsgiSocket(app, f"/ws/{room_code}/player")
+            await host.connect()
+            await player.connect()
+            await player.send({"action": "join_room", "nickname": "marathon"})
+            participant_id = (await expect_event(player, "waiting_approval"))["participant_id"]
+            await host.send({"action": "approve_player", "participant_id": participant_id})
+            await expect_event(host, "participants_update")
+            host_drain = asyncio.create_task(expect_event(host, "never"))
+            await host.send({"action": "start_quiz"})
+            question = (await expect_event(player, "quiz_started"))["question"]
+            for index in range(100):
+                await player.send({"action": "submit_answer", "participant_id": participant_id,
+                                   "question_id": question["id"], "choice_ids": [question["choices"][0]["id"]],
+                                   "response_time": 1.0})
+                assert (await expect_event(player, "answer_result"))["is_correct"] is True
+                await host.send({"action": "next_question"})
+                if index == 19:
+                    gc.collect()
+                    tracemalloc.start()
+                    samples["early_sessions"] = len(identity_sizes)
+                if index == 99:
+                    await expect_event(player, "quiz_finished")
+                    gc.collect()
+                    samples["growth"] = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.stop()
+                else:
+                    question = (await expect_event(player, "next_question"))["question"]
+            host_drain.cancel()
+            await player.close()
+            await host.close()
+            return samples
+
+        samples = asyncio.run(asyncio.wait_for(play(), timeout=60))
+        early = max(identity_sizes[:samples["early_sessions"]])
+        late = max(identity_sizes[samples["early_sessions"]:])
+        assert late <= early
+        assert len(identity_sizes) == len(opened)
+        assert samples["growth"] / 80 < 16 * 1024
+
+
+class TestAnswerQueue:
+    def test_answers_are_batched_and_deduplicated(self, client):
+        """
+        Проверка: Очередь ответов комнаты обрабатывает пачку ответов одной транзакцией, включая повторы.
+        Ожидаемый результат: Каждый игрок получает свой результат, повтор возвращает тот же результат и не удваивает очки.
+        """
+        import asyncio
+        from answer_queue import AnswerQueue
+
+        db = TestingSessionLocal()
+        try:
+            user = models.User(username="queue_user", hashed_password="pw")
+            db.add(user)
+            db.commit()
+
+            quiz = models.Quiz(title="Queue Quiz", creator_id=user.id)
+            db.add(quiz)
+            db.commit()
+
+            question = models.Question(text="Q1", quiz_id=quiz.id, timer_seconds=10)
+            db.add(question)
+            db.commit()
+
+            correct = models.Choice(text="Correct", is_correct=True, question_id=question.id)
+            wrong = models.Choice(text="Wrong", is_correct=False, question_id=question.id)
+            db.add_all([correct, wrong])
+            db.commit()
+
+            room = models.Room(code="QUEUE1", quiz_id=quiz.id)
+            db.add(room)
+            db.commit()
 
+            participants = [models.Participant(room_id=room.id, user_id=user.id) for _ in range(3)]
+            db.add_all(participants)
+            db.commit()
+            ids = [p.id for p in participants]
+            question_id, correct_id, wrong_id = question.id, correct.id, wrong.id
         finally:
             db.close()
 
+        async def play():
+            queue = AnswerQueue(session_factory=TestingSessionLocal, batch_interval=0.05, batch_size=200)
+            return await asyncio.gather(
+                queue.submit("QUEUE1", ids[0], question_id, [correct_id], 0.0),
+                queue.submit("QUEUE1", ids[1], question_id, [correct_id], 0.0),
+                queue.submit("QUEUE1", ids[2], question_id, [wrong_id], 0.0),
+                queue.submit("QUEUE1", ids[0], question_id, [correct_id], 0.0),
+            )
+
+        results = asyncio.run(play())
+        assert results[0] == (1000, True)
+        assert results[1] == (800, True)
+        assert results[2] == (0, False)
+        assert results[3] == results[0]
+
+        db = TestingSessionLocal()
+        try:
+            assert db.query(models.Answer).filter(models.Answer.question_id == question_id).count() == 3
+            scores = {p.id: p.score for p in db.query(models.Participant).filter(models.Participant.id.in_(ids))}
+            assert scores == {ids[0]: 1000, ids[1]: 800, ids[2]: 0}
+        finally:
+            db.close()
+
+
 class TestHealthCheck:
     def test_health_check(self, client):
         """
@@ -813,3 +1092,855 @@ class TestHealthCheck:
         response = client.get("/health")
         assert response.status_code == 200
         assert response.json()["status"] == "ok"
+
+
+class TestMetrics:
+    def test_metrics_endpoint_reports_hot_paths(self, client):
+        """
+        Проверка: /metrics отдает гистограммы HTTP по шаблону маршрута, времени хеширования и SQL-запросов.
+        Ожидаемый результат: Текстовый формат Prometheus с сериями для /rooms/{room_code} и Argon2.
+        """
+        import metrics
+
+        metrics.instrument_engine(engine)
+        client.post("/register", json={"username": "metrics_user", "password": "pass123"})
+        client.get("/rooms/NOPE01")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        assert 'myquiz_http_request_duration_seconds_count{method="GET",route="/rooms/{room_code}",status="404"}' in text
+        assert 'myquiz_password_hash_duration_seconds_count{operation="hash"}' in text
+        assert 'myquiz_db_query_duration_seconds_count{operation="SELECT"}' in text
+        assert "# TYPE myquiz_room_connected_sockets gauge" in text
+
+    def test_histogram_buckets_are_cumulative(self):
+        """
+        Проверка: Бакеты гистограммы накопительные, сумма и количество считаются по всем наблюдениям.
+        Ожидаемый результат: le="+Inf" равен _count, значения вне диапазона попадают только в +Inf.
+        """
+        from metrics import Histogram
+
+        histogram = Histogram("test_seconds", "Test.", ("action",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, "submit_answer")
+        lines = list(histogram.collect())
+        assert lines == [
+            'test_seconds_bucket{action="submit_answer",le="0.1"} 1',
+            'test_seconds_bucket{action="submit_answer",le="1"} 3',
+            'test_seconds_bucket{action="submit_answer",le="+Inf"} 4',
+            'test_seconds_sum{action="submit_answer"} 4.05',
+            'test_seconds_count{action="submit_answer"} 4',
+        ]
+
+
+class TestQueryBudget:
+    @pytest.fixture(autouse=True)
+    def setup(self, client, monkeypatch):
+        import querybudget
+
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        querybudget.instrument_engine(engine)
+        monkeypatch.setattr(querybudget, "QUERY_BUDGET_ENABLED", True)
+        monkeypatch.setattr(querybudget, "violations", [])
+
+        client.post("/register", json={"username": "budget_player", "password": "pass123"})
+        self.token = client.post("/login", json={"username": "budget_player", "password": "pass123"}).json()["access_token"]
+
+        db = TestingSessionLocal()
+        player = db.query(models.User).filter(models.User.username == "budget_player").first()
+        db.add(models.Category(name="Budget"))
+        quiz = models.Quiz(title="Budget Quiz", creator_id=player.id, category_id=1)
+        db.add(quiz)
+        db.flush()
+        users = [models.User(username=f"budget_{i}", hashed_password="x") for i in range(10)]
+        db.add_all(users)
+        db.flush()
+        self.codes = []
+        for r in range(3):
+            room = models.Room(code=f"BUDG0{r}", quiz_id=quiz.id, status="finished")
+            db.add(room)
+            db.flush()
+            db.add(models.Participant(room_id=room.id, user_id=player.id, is_approved=True, score=500))
+            for i, user in enumerate(users):
+                db.add(models.Participant(room_id=room.id, user_id=user.id, is_approved=True, score=100 * i))
+            self.codes.append(room.code)
+        db.commit()
+        db.close()
+
+    def test_room_endpoints_stay_within_budget(self, client):
+        """
+        Проверка: Информация о комнате, таблица лидеров и история не делают запрос на каждого участника.
+        Ожидаемый результат: X-Query-Count не превышает объявленный бюджет, нарушений нет.
+        """
+        import querybudget
+
+        info = client.get(f"/rooms/{self.codes[0]}")
+        assert info.json()["participants_count"] == 11
+        assert int(info.headers["x-query-count"]) <= 2
+
+        leaderboard = client.get(f"/rooms/{self.codes[0]}/leaderboard")
+        usernames = [entry["username"] for entry in leaderboard.json()["leaderboard"]]
+        assert usernames[:2] == ["budget_9", "budget_8"]
+        assert "budget_player" in usernames
+        assert int(leaderboard.headers["x-query-count"]) <= 2
+
+        history = client.get("/users/me/history", headers={"Authorization": f"Bearer {self.token}"})
+        entries = history.json()
+        assert len(entries) == 6
+        assert {entry["rank"] for entry in entries if entry["role"] == "player"} == {"5/11"}
+        assert {entry["quiz_title"] for entry in entries} == {"Budget Quiz"}
+        assert int(history.headers["x-query-count"]) <= 4
+
+        assert querybudget.violations == []
+
+    def test_repeated_statements_are_reported(self, caplog):
+        """
+        Проверка: Повторяющаяся форма запроса внутри одного действия считается возможным N+1.
+        Ожидаемый результат: Предупреждение в логе и запись о превышении бюджета.
+        """
+        import logging
+        import querybudget
+
+        db = TestingSessionLocal()
+        try:
+            with caplog.at_level(logging.WARNING, logger="querybudget"):
+                with querybudget.track("WS show_leaderboard", 2) as tracker:
+                    for i in range(4):
+                        db.query(models.User).filter(models.User.username == f"budget_{i}").first()
+        finally:
+            db.close()
+
+        assert tracker.count == 4
+        assert list(tracker.repeated().values()) == [4]
+        assert "possible N+1" in caplog.text
+        assert querybudget.violations == [("WS show_leaderboard", 4, 2)]
+
+
+class TestProfiler:
+    def test_samples_are_attributed_to_room_and_action(self):
+        """
+        Проверка: Сэмпл стека из обработчика WebSocket помечается комнатой и текущим действием.
+        Ожидаемый результат: Свернутый стек вида room:...;action:...;websocket_endpoint;... и фильтр по комнате.
+        """
+        from profiler import SamplingProfiler
+
+        profiler = SamplingProfiler()
+
+        def encode_leaderboard():
+            profiler._sample()
+
+        def websocket_endpoint(room_code, action_label):
+            encode_leaderboard()
+
+        websocket_endpoint("PROF01", "show_leaderboard")
+        profiler.room_code = "PROF01"
+        websocket_endpoint("OTHER1", "submit_answer")
+
+        lines = profiler.folded().splitlines()
+        assert len(lines) == 1
+        stack, count = lines[0].rsplit(" ", 1)
+        frames = stack.split(";")
+        assert frames[:2] == ["room:PROF01", "action:show_leaderboard"]
+        assert frames[2].startswith("websocket_endpoint (")
+        assert frames[3].startswith("encode_leaderboard (")
+        assert count == "1"
+
+    def test_profiler_admin_endpoints(self, client, monkeypatch):
+        """
+        Проверка: Профилировщик включается и выключается только администратором.
+        Ожидаемый результат: 403 без токена, 409 при повторном запуске, остановка возвращает text/plain.
+        """
+        import auth
+        import main
+
+        monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+        headers = {"X-Admin-Token": "secret"}
+        assert client.post("/internal/profiler/start", json={}).status_code == 403
+
+        response = client.post("/internal/profiler/start", json={"room_code": "PROF02", "seconds": 5, "interval_ms": 1}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["running"] is True
+        assert response.json()["room_code"] == "PROF02"
+        assert client.post("/internal/profiler/start", json={}, headers=headers).status_code == 409
+
+        stopped = client.post("/internal/profiler/stop", headers=headers)
+        assert stopped.status_code == 200
+        assert stopped.headers["content-type"].startswith("text/plain")
+        assert main.profiler.running is False
+        assert client.get("/internal/profiler", headers=headers).json()["running"] is False
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+class StalledWebSocket(FakeWebSocket):
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+
+class TestBroadcast:
+    def test_broadcast_encodes_message_once(self):
+        """
+        Проверка: Рассылка кодирует сообщение один раз и отправляет одну и ту же строку всем сокетам.
+        Ожидаемый результат: Все игроки и ведущий получают один и тот же объект кадра.
+        """
+        import asyncio
+        import json
+        from rooms import ConnectionManager
+
+        manager = ConnectionManager()
+        players = [FakeWebSocket() for _ in range(3)]
+        host = FakeWebSocket()
+        manager.active_connections["BCAST1"] = players
+        manager.room_hosts["BCAST1"] = host
+
+        async def play():
+            await manager.broadcast("BCAST1", {"event": "quiz_started", "text": "Вопрос"})
+            await manager.flush()
+
+        asyncio.run(play())
+
+        frames = [ws.sent[0] for ws in players] + [host.sent[0]]
+        assert all(frame is frames[0] for frame in frames)
+        assert json.loads(frames[0]) == {"event": "quiz_started", "text": "Вопрос"}
+
+
+class TestRoomLimits:
+    def test_room_full_rejects_extra_player(self):
+        """
+        Проверка: Игрок сверх MAX_PLAYERS_PER_ROOM получает отказ, а не место в комнате.
+        Ожидаемый результат: Событие connection_rejected с reason=room_full и закрытие с кодом 1013.
+        """
+        import json
+        from rooms import ConnectionManager
+
+        async def play():
+            manager = ConnectionManager(max_players=2)
+            accepted = [await manager.connect(FakeWebSocket(), "FULL1", False) for _ in range(2)]
+            extra = FakeWebSocket()
+            assert await manager.connect(extra, "FULL1", False) is False
+            assert await manager.connect(FakeWebSocket(), "FULL1", True) is True
+            return manager, accepted, extra
+
+        manager, accepted, extra = asyncio.run(play())
+        assert accepted == [True, True]
+        assert json.loads(extra.sent[0]) == {"event": "connection_rejected", "reason": "room_full"}
+        assert extra.closed == 1013
+        assert len(manager.active_connections["FULL1"]) == 2
+        assert manager.stats()["rejections"] == {"room_full": 1}
+
+    def test_worker_room_limit(self):
+        """
+        Проверка: Воркер не открывает новые комнаты сверх MAX_ROOMS_PER_WORKER, но пускает в уже открытые.
+        Ожидаемый результат: Новая комната отклоняется с too_many_rooms, существующая принимает игроков.
+        """
+        import json
+        from rooms import ConnectionManager
+
+        async def play():
+            manager = ConnectionManager(max_rooms=1)
+            await manager.connect(FakeWebSocket(), "ROOMA", True)
+            rejected = FakeWebSocket()
+            assert await manager.connect(rejected, "ROOMB", False) is False
+            assert await manager.connect_spectator(FakeWebSocket(), "ROOMC") is False
+            assert await manager.connect(FakeWebSocket(), "ROOMA", False) is True
+            return rejected
+
+        rejected = asyncio.run(play())
+        assert json.loads(rejected.sent[0])["reason"] == "too_many_rooms"
+
+    def test_slow_consumer_dropped_when_socket_budget_exceeded(self):
+        """
+        Проверка: Сокет, который не читает сообщения, не может раздувать свою очередь сверх лимита.
+        Ожидаемый результат: Медленный сокет закрывается, его очередь освобождается, остальные получают все кадры.
+        """
+        from rooms import ConnectionManager
+
+        async def play():
+            manager = ConnectionManager(max_queued_bytes=2000)
+            fast = FakeWebSocket()
+            slow = StalledWebSocket()
+            manager.active_connections["SLOW1"] = [fast, slow]
+            for i in range(20):
+                await manager.broadcast("SLOW1", {"event": "tick", "payload": "x" * 200, "i": i})
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.01)
+            return manager, fast, slow
+
+        manager, fast, slow = asyncio.run(play())
+        assert len(fast.sent) == 20
+        assert slow.closed == 1013
+        assert slow not in manager.outboxes
+        assert manager.queued_bytes["SLOW1"] == 0
+        assert manager.stats()["rejections"] == {"slow_consumer": 1}
+
+    def test_large_room_survives_back_to_back_leaderboards(self):
+        """
+        Проверка: Ведущий переключает вопрос в комнате на 500 игроков: подряд уходят результаты с полной таблицей лидеров и следующий вопрос.
+        Ожидаемый результат: Ни один здоровый сокет не отключается, все получают оба кадра, отключается только зависший сокет.
+        """
+        from rooms import ConnectionManager
+
+        leaderboard = [{"nickname": f"player{i}", "score": 1000.0 - i, "place": i + 1} for i in range(500)]
+
+        async def play():
+            manager = ConnectionManager()
+            players = [FakeWebSocket() for _ in range(500)]
+            slow = StalledWebSocket()
+            manager.active_connections["BIG1"] = players + [slow]
+            for i in range(40):
+                await manager.broadcast("BIG1", {"event": "show_results", "leaderboard": leaderboard})
+                await manager.broadcast("BIG1", {"event": "next_question", "question": {"id": i, "text": "Q"}})
+            await manager.flush()
+            return manager, players, slow
+
+        manager, players, slow = asyncio.run(play())
+        assert all(len(ws.sent) == 80 and not hasattr(ws, "closed") for ws in players)
+        assert slow.closed == 1013
+        assert manager.stats()["rejections"] == {"slow_consumer": 1}
+
+    def test_internal_stats_requires_admin_token(self, client, monkeypatch):
+        """
+        Проверка: /internal/stats доступен только с корректным X-Admin-Token.
+        Ожидаемый результат: 403 без токена; с токеном — поcчитанные игроки, байты состояния и лимиты.
+        """
+        import auth
+        from main import manager
+
+        monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+        manager.active_connections["STAT01"] = [FakeWebSocket()]
+        manager.room_state("STAT01").set_question({"id": 1, "text": "Q", "timer_seconds": 10, "choices": []})
+        try:
+            assert client.get("/internal/stats").status_code == 403
+            assert client.get("/internal/stats", headers={"X-Admin-Token": "wrong"}).status_code == 403
+            response = client.get("/internal/stats", headers={"X-Admin-Token": "secret"})
+            assert response.status_code == 200
+            data = response.json()
+            room = data["rooms"]["STAT01"]
+            assert room["players"] == 1
+            assert room["state_bytes"] > 0
+            assert room["queued_bytes"] == 0
+            assert data["limits"]["max_players_per_room"] == manager.max_players
+        finally:
+            manager.release("STAT01")
+
+
+class TestSpectator:
+    def test_room_state_counts_each_player_once(self):
+        """
+        Проверка: Гистограмма ответов в памяти учитывает только первый ответ игрока на текущий вопрос.
+        Ожидаемый результат: Повторы и ответы на другие вопросы не меняют счетчики.
+        """
+        from rooms import RoomState
+
+        state = RoomState()
+        state.set_question({"id": 1, "text": "Q", "timer_seconds": 10, "choices": [{"id": 10, "text": "A"}, {"id": 11, "text": "B"}]})
+        state.record_answer(100, 1, [10])
+        state.record_answer(100, 1, [11])
+        state.record_answer(101, 1, [11])
+        state.record_answer(102, 2, [10])
+        state.set_leaderboard([{"username": f"p{i}", "score": 100 - i} for i in range(15)])
+
+        snapshot = state.snapshot()
+        assert snapshot["answer_counts"] == {10: 1, 11: 1}
+        assert snapshot["answers_total"] == 2
+        assert len(snapshot["leaderboard"]) == 10
+
+    def test_spectator_receives_feed_without_database(self, client, monkeypatch):
+        """
+        Проверка: Зритель подключается к /ws/{room_code}/spectator и получает снимок состояния комнаты по таймеру.
+        Ожидаемый результат: Начальный снимок и обновление после смены вопроса, без обращения к базе данных.
+        """
+        import main
+        import database
+
+        def no_database():
+            raise AssertionError("spectator must not open a database session")
+
+        monkeypatch.setattr(database, "SessionLocal", no_database)
+        monkeypatch.setattr(main.manager, "spectator_tick", 0.01)
+
+        with client.websocket_connect("/ws/SPECT1/spectator") as ws:
+            first = ws.receive_json()
+            assert first["event"] == "spectator_update"
+            assert first["question"] is None
+
+            main.manager.room_state("SPECT1").set_question({"id": 5, "text": "Q", "timer_seconds": 10, "choices": [{"id": 7, "text": "A"}]})
+            update = ws.receive_json()
+            assert update["question"]["id"] == 5
+            assert update["answer_counts"] == {"7": 0}
+
+        assert "SPECT1" not in main.manager.spectators
+
+
+class TestAnswerStats:
+    def test_answer_stats_are_throttled(self):
+        """
+        Проверка: Серия ответов порождает не более одного события answer_stats ведущему за интервал.
+        Ожидаемый результат: Пять ответов подряд дают одно событие с актуальными счетчиками.
+        """
+        import asyncio
+        import json
+        from rooms import ConnectionManager
+
+        async def play():
+            manager = ConnectionManager(stats_interval=0.05)
+            host = FakeWebSocket()
+            manager.room_hosts["STATS1"] = host
+            state = manager.room_state("STATS1")
+            state.set_question({"id": 1, "text": "Q", "timer_seconds": 10, "choices": [{"id": 10, "text": "A"}, {"id": 11, "text": "B"}]})
+            for participant_id in range(5):
+                if state.record_answer(participant_id, 1, [10 if participant_id < 3 else 11]):
+                    manager.push_answer_stats("STATS1")
+            await asyncio.sleep(0.01)
+            state.record_answer(5, 1, [11])
+            manager.push_answer_stats("STATS1")
+            await asyncio.sleep(0.1)
+            return [json.loads(frame) for frame in host.sent]
+
+        events = asyncio.run(play())
+        assert len(events) == 2
+        assert events[0] == {"event": "answer_stats", "question_id": 1, "counts": {"10": 3, "11": 2}, "total": 5}
+        assert events[1]["counts"] == {"10": 3, "11": 3}
+
+    def test_answer_distribution_persisted_on_close(self, client):
+        """
+        Проверка: Распределение ответов сохраняется в БД при закрытии вопроса.
+        Ожидаемый результат: По одной строке на вариант; повторное закрытие не создает дубликатов.
+        """
+        from rooms import RoomState
+
+        state = RoomState()
+        state.set_question({"id": 1, "text": "Q", "timer_seconds": 10, "choices": [{"id": 10, "text": "A"}, {"id": 11, "text": "B"}]})
+        state.record_answer(1, 1, [11])
+        closed = state.close_question()
+        assert closed == (1, {10: 0, 11: 1})
+        assert state.close_question() is None
+        assert state.record_answer(2, 1, [10]) is False
+
+        db = TestingSessionLocal()
+        try:
+            crud.save_answer_distribution(db, 77, *closed)
+            crud.save_answer_distribution(db, 77, *closed)
+            rows = db.query(models.AnswerDistribution).filter(models.AnswerDistribution.room_id == 77).all()
+            assert {(r.choice_id, r.count) for r in rows} == {(10, 0), (11, 1)}
+        finally:
+            db.close()
+
+
+class TestQuizStats:
+    def test_stats_aggregated_when_room_finishes(self, client):
+        """
+        Проверка: Агрегация ответов комнаты в сводные таблицы и чтение /quizzes/{quiz_id}/stats.
+        Ожидаемый результат: Верные доля правильных ответов, среднее и медиана времени; повторная агрегация не удваивает данные.
+        """
+        client.post("/register", json={"username": "stats_user", "password": "password123"})
+        token = client.post("/login", json={"username": "stats_user", "password": "password123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        quiz_id = client.post("/quizzes", json={"title": "Stats Quiz"}, headers=headers).json()["id"]
+        questions = [
+            client.post(f"/quizzes/{quiz_id}/questions", json={
+                "text": f"Q{i}",
+                "timer_seconds": 10,
+                "choices": [{"text": "Yes", "is_correct": True}, {"text": "No", "is_correct": False}]
+            }, headers=headers).json()
+            for i in range(2)
+        ]
+
+        db = TestingSessionLocal()
+        try:
+            room_ids = []
+            for code in ("STAT01", "STAT02"):
+                room = models.Room(code=code, quiz_id=quiz_id)
+                db.add(room)
+                db.commit()
+                room_ids.append(room.id)
+                for response_time, correct_first in ((1.0, True), (3.0, True), (5.0, False)):
+                    participant = models.Participant(room_id=room.id, is_approved=True)
+                    db.add(participant)
+                    db.commit()
+                    for q in questions:
+                        is_correct = correct_first if q is questions[0] else False
+                        choice = q["choices"][0 if is_correct else 1]
+                        db.add(models.Answer(participant_id=participant.id, question_id=q["id"], choice_id=choice["id"],
+                                             response_time=response_time, is_correct=is_correct))
+                    db.commit()
+
+            crud.aggregate_room_stats(db, room_ids[0])
+            crud.aggregate_room_stats(db, room_ids[0])
+            crud.aggregate_room_stats(db, room_ids[1])
+        finally:
+            db.close()
+
+        response = client.get(f"/quizzes/{quiz_id}/stats", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["plays"] == 2
+        assert data["answers_count"] == 12
+        by_id = {q["question_id"]: q for q in data["questions"]}
+        first = by_id[questions[0]["id"]]
+        assert first["plays"] == 2
+        assert first["answers_count"] == 6
+        assert abs(first["correct_rate"] - 2 / 3) < 1e-9
+        assert first["avg_response_time"] == 3.0
+        assert first["median_response_time"] == 3.25
+        assert data["hardest_questions"][0]["question_id"] == questions[1]["id"]
+
+    def test_stats_require_quiz_owner(self, client):
+        """
+        Проверка: Статистику викторины может смотреть только ее автор.
+        Ожидаемый результат: 403 Forbidden для другого пользователя, 404 для несуществующей викторины.
+        """
+        client.post("/register", json={"username": "stats_owner", "password": "password123"})
+        client.post("/register", json={"username": "stats_other", "password": "password123"})
+        owner = client.post("/login", json={"username": "stats_owner", "password": "password123"}).json()["access_token"]
+        other = client.post("/login", json={"username": "stats_other", "password": "password123"}).json()["access_token"]
+        quiz_id = client.post("/quizzes", json={"title": "Private"}, headers={"Authorization": f"Bearer {owner}"}).json()["id"]
+
+        assert client.get(f"/quizzes/{quiz_id}/stats", headers={"Authorization": f"Bearer {other}"}).status_code == 403
+        assert client.get("/quizzes/99999/stats", headers={"Authorization": f"Bearer {owner}"}).status_code == 404
+        empty = client.get(f"/quizzes/{quiz_id}/stats", headers={"Authorization": f"Bearer {owner}"}).json()
+        assert empty["plays"] == 0
+
+
+class TestRescoring:
+    def _play_room(self, client, username, code):
+        client.post("/register", json={"username": username, "password": "password123"})
+        token = client.post("/login", json={"username": username, "password": "password123"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        quiz_id = client.post("/quizzes", json={"title": "Rescore Quiz"}, headers=headers).json()["id"]
+        question = client.post(f"/quizzes/{quiz_id}/questions", json={
+            "text": "Q",
+            "timer_seconds": 10,
+            "choices": [{"text": "A", "is_correct": True}, {"text": "B", "is_correct": False}]
+        }, headers=headers).json()
+        right, wrong = question["choices"][0]["id"], question["choices"][1]["id"]
+
+        db = TestingSessionLocal()
+        try:
+            room = models.Room(code=code, quiz_id=quiz_id)
+            db.add(room)
+            db.commit()
+            participants = [models.Participant(room_id=room.id, is_approved=True) for _ in range(6)]
+            db.add_all(participants)
+            db.commit()
+            plan = [(right, 1.0), (wrong, 2.0), (right, 3.5), (right, 4.0), (right, 7.0), (wrong, 13.0)]
+            for participant, (choice_id, response_time) in zip(participants, plan):
+                crud.process_answer(db, participant.id, question["id"], choice_id, response_time)
+            return headers, room.id, question["id"], right, wrong, [p.id for p in participants]
+        finally:
+            db.close()
+
+    def test_rescoring_matches_process_answer(self, client):
+        """
+        Проверка: Векторный пересчет очков комнаты без изменений в вопросах.
+        Ожидаемый результат: Очки ответов и участников совпадают с начисленными при игре.
+        """
+        import rescoring
+
+        _, room_id, _, _, _, participant_ids = self._play_room(client, "rescore_same", "RESC01")
+        db = TestingSessionLocal()
+        try:
+            before = {a.id: a.points for a in db.query(models.Answer).filter(models.Answer.participant_id.in_(participant_ids))}
+            result = rescoring.rescore_room(db, room_id)
+            db.expire_all()
+            after = {a.id: a.points for a in db.query(models.Answer).filter(models.Answer.participant_id.in_(participant_ids))}
+            assert result["answers_updated"] == 0
+            assert after == before
+        finally:
+            db.close()
+
+    def test_rescore_after_correct_choice_fixed(self, client):
+        """
+        Проверка: Исправление правильного варианта после игры и пересчет через POST /rooms/{room_code}/rescore.
+        Ожидаемый результат: Очки ответов и участников пересчитаны по новому правильному варианту.
+        """
+        headers, room_id, question_id, right, wrong, participant_ids = self._play_room(client, "rescore_fix", "RESC02")
+        db = TestingSessionLocal()
+        try:
+            db.query(models.Choice).filter(models.Choice.id == right).update({"is_correct": False})
+            db.query(models.Choice).filter(models.Choice.id == wrong).update({"is_correct": True})
+            db.commit()
+        finally:
+            db.close()
+
+        response = client.post("/rooms/RESC02/rescore", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["answers_updated"] == 6
+
+        db = TestingSessionLocal()
+        try:
+            scores = {p.id: p.score for p in db.query(models.Participant).filter(models.Participant.room_id == room_id)}
+            assert scores[participant_ids[0]] == 0
+            assert scores[participant_ids[1]] == 900
+            assert scores[participant_ids[5]] == 0
+        finally:
+            db.close()
+
+    def test_score_answers_handles_interleaved_questions(self):
+        """
+        Проверка: Порядковый множитель считается отдельно для каждого вопроса при перемешанных ответах.
+        Ожидаемый результат: Первый правильный ответ на каждый вопрос получает полный множитель.
+        """
+        import numpy as np
+        import rescoring
+
+        points = rescoring.score_answers(
+            np.array([1, 2, 1, 2, 1]),
+            np.array([True, True, False, True, True]),
+            np.zeros(5),
+            np.full(5, 10)
+        )
+        assert points.tolist() == [1000.0, 1000.0, 0.0, 800.0, 800.0]
+
+
+def reference_score(is_correct, answer_order, response_time, timer):
+    score_earned = 0
+    if is_correct:
+        order_multipliers = {1: 1.0, 2: 0.8, 3: 0.6}
+        order_factor = order_multipliers.get(answer_order, 0.4)
+        effective_time = min(response_time, timer)
+        time_factor = 1 - (effective_time / timer / 2)
+        score_earned = round(1000 * order_factor * time_factor)
+    if response_time > timer + 2.0:
+        score_earned = 0
+    return score_earned
+
+
+class TestScoringStrategies:
+    @settings(max_examples=300)
+    @given(
+        is_correct=st.booleans(),
+        answer_order=st.integers(min_value=1, max_value=50),
+        response_time=st.floats(min_value=0, max_value=200, allow_nan=False),
+        timer=st.integers(min_value=1, max_value=120)
+    )
+    def test_classic_matches_original_formula(self, is_correct, answer_order, response_time, timer):
+        """
+        Проверка: Скомпилированная классическая стратегия совпадает с исходной формулой process_answer.
+        Ожидаемый результат: Одинаковые очки для любых порядка, времени ответа и таймера.
+        """
+        import scoring
+
+        score = scoring.ScoringStrategy().compile()
+        expected = reference_score(is_correct, answer_order, response_time, timer)
+        assert score(1.0 if is_correct else 0.0, answer_order, response_time, timer, 1) == expected
+
+    @settings(max_examples=100)
+    @given(
+        mode=st.sampled_from(["classic", "fixed"]),
+        streak_bonus=st.sampled_from([0, 50]),
+        answers=st.lists(
+            st.tuples(
+                st.integers(min_value=1, max_value=4),
+                st.integers(min_value=1, max_value=5),
+                st.booleans(),
+                st.floats(min_value=0, max_value=40, allow_nan=False)
+            ),
+            max_size=40
+        )
+    )
+    def test_vectorized_matches_compiled(self, mode, streak_bonus, answers):
+        """
+        Проверка: Векторный пересчет и пооответный скорер комнаты дают одинаковые очки для всех стратегий.
+        Ожидаемый результат: Совпадение очков, включая бонус за серию правильных ответов.
+        """
+        import numpy as np
+        import rescoring
+        import scoring
+
+        strategy = scoring.resolve(mode, {"streak_bonus": streak_bonus})
+        scorer = scoring.RoomScorer(strategy)
+        correct_counts = {}
+        expected = []
+        for participant_id, question_id, is_correct, response_time in answers:
+            answer_order = correct_counts.get(question_id, 0) + 1
+            if is_correct:
+                correct_counts[question_id] = answer_order
+            expected.append(scorer(participant_id, 1.0 if is_correct else 0.0, answer_order, response_time, 20))
+
+        columns = list(zip(*answers)) or [(), (), (), ()]
+        points = rescoring.score_answers(
+            np.array(columns[1], dtype=np.int64),
+            np.array(columns[2], dtype=bool),
+            np.array(columns[3], dtype=np.float64),
+            np.full(len(answers), 20),
+            strategy,
+            np.array(columns[0], dtype=np.int64)
+        )
+        assert points.tolist() == expected
+
+    def test_fixed_points_and_unknown_mode(self):
+        """
+        Проверка: Режим фиксированных очков и ошибка для неизвестного режима.
+        Ожидаемый результат: Любой правильный ответ в срок дает max_points; неизвестный режим вызывает ValueError.
+        """
+        import scoring
+
+        score = scoring.resolve("fixed", {"max_points": 500}).compile()
+        assert score(1.0, 7, 19.0, 20, 1) == 500
+        assert score(1.0, 1, 23.0, 20, 1) == 0
+        assert score(0.0, 1, 1.0, 20, 0) == 0
+        with pytest.raises(ValueError):
+            scoring.resolve("lottery")
+        with pytest.raises(ValueError):
+            scoring.resolve("classic", {"jackpot": 1})
+
+
+class TestMultipleChoice:
+    def _multiple_question(self, code):
+        db = TestingSessionLocal()
+        try:
+            user = models.User(username=f"multi_{code}", hashed_password="pw")
+            db.add(user)
+            db.commit()
+            quiz = models.Quiz(title="Multi Quiz", creator_id=user.id)
+            db.add(quiz)
+            db.commit()
+            question = models.Question(text="Pick all", quiz_id=quiz.id, timer_seconds=10, question_type="multiple")
+            db.add(question)
+            db.commit()
+            choices = [models.Choice(text=t, is_correct=c, question_id=question.id)
+                       for t, c in (("A", True), ("B", True), ("C", False), ("D", False))]
+            db.add_all(choices)
+            room = models.Room(code=code, quiz_id=quiz.id)
+            db.add(room)
+            db.commit()
+            participants = [models.Participant(room_id=room.id, user_id=user.id) for _ in range(4)]
+            db.add_all(participants)
+            db.commit()
+            return question.id, [c.id for c in choices], [p.id for p in participants]
+        finally:
+            db.close()
+
+    def test_multiple_choice_answer_is_one_record(self, client):
+        """
+        Проверка: Ответ на вопрос с несколькими правильными вариантами передается списком choice_ids.
+        Ожидаемый результат: Верным считается только точное совпадение множества; ответ хранится одной записью.
+        """
+        question_id, (a, b, c, d), participants = self._multiple_question("MULTI1")
+        db = TestingSessionLocal()
+        try:
+            assert crud.process_answer(db, participants[0], question_id, None, 0.0, choice_ids=[b, a]) == 1000
+            assert crud.process_answer(db, participants[1], question_id, None, 0.0, choice_ids=[a]) == 0
+            assert crud.process_answer(db, participants[2], question_id, None, 0.0, choice_ids=[a, b, c]) == 0
+
+            answers = db.query(models.Answer).filter(models.Answer.question_id == question_id).all()
+            assert len(answers) == 3
+            first = next(x for x in answers if x.participant_id == participants[0])
+            assert first.is_correct is True
+            assert first.choice_ids == sorted([a, b])
+            assert first.choice_id is None
+        finally:
+            db.close()
+
+    def test_partial_credit_for_multiple_choice(self, client):
+        """
+        Проверка: Частичные баллы за вопрос с несколькими ответами при включенном partial_credit.
+        Ожидаемый результат: Очки пропорциональны (верные - лишние) / число верных, ответ не считается полностью верным.
+        """
+        import scoring
+
+        question_id, (a, b, c, d), participants = self._multiple_question("MULTI2")
+        scorer = scoring.RoomScorer(scoring.resolve("fixed", {"partial_credit": True}))
+        db = TestingSessionLocal()
+        try:
+            results = crud.process_answers(db, [
+                {"participant_id": participants[0], "question_id": question_id, "choice_ids": [a], "response_time": 1.0},
+                {"participant_id": participants[1], "question_id": question_id, "choice_ids": [a, c], "response_time": 1.0},
+                {"participant_id": participants[2], "question_id": question_id, "choice_ids": [a, b], "response_time": 1.0},
+                {"participant_id": participants[3], "question_id": question_id, "choice_ids": [999], "response_time": 1.0},
+            ], scorer)
+            assert results == [(500, False), (0, False), (1000, True), (0, False)]
+        finally:
+            db.close()
+
+
+class TestMaintenance:
+    def test_idle_rooms_expired_and_answers_archived(self, client):
+        """
+        Проверка: Фоновое обслуживание переводит брошенные комнаты в 'expired' и архивирует старые ответы в сводки.
+        Ожидаемый результат: Подключенная комната не трогается; ответы старой комнаты удалены, сводка по вопросу осталась.
+        """
+        import datetime
+        import maintenance
+
+        db = TestingSessionLocal()
+        try:
+            user = models.User(username="reaper_user", hashed_password="pw")
+            db.add(user)
+            db.commit()
+            quiz = models.Quiz(title="Reaper Quiz", creator_id=user.id)
+            db.add(quiz)
+            db.commit()
+            question = models.Question(text="Q", quiz_id=quiz.id, timer_seconds=10)
+            db.add(question)
+            db.commit()
+            choice = models.Choice(text="A", is_correct=True, question_id=question.id)
+            db.add(choice)
+            db.commit()
+
+            long_ago = datetime.datetime.utcnow() - datetime.timedelta(days=90)
+            stale = models.Room(code="REAP01", quiz_id=quiz.id, status="active", created_at=long_ago)
+            connected = models.Room(code="REAP02", quiz_id=quiz.id, status="waiting", created_at=long_ago)
+            fresh = models.Room(code="REAP03", quiz_id=quiz.id, status="waiting")
+            db.add_all([stale, connected, fresh])
+            db.commit()
+            db.query(models.Room).filter(models.Room.code.in_(["REAP01", "REAP02"])).update(
+                {"updated_at": long_ago}, synchronize_session=False
+            )
+            db.commit()
+
+            participant = models.Participant(room_id=stale.id, is_approved=True)
+            db.add(participant)
+            db.commit()
+            crud.process_answer(db, participant.id, question.id, choice.id, 1.0)
+
+            expired = maintenance.expire_idle_rooms(db, 60, connected_codes=["REAP02"])
+            assert expired == ["REAP01"]
+            db.expire_all()
+            statuses = {r.code: r.status for r in db.query(models.Room).filter(models.Room.code.like("REAP%"))}
+            assert statuses == {"REAP01": "expired", "REAP02": "waiting", "REAP03": "waiting"}
+
+            assert maintenance.archive_old_answers(db, 30, 10) == 1
+            assert db.query(models.Answer).filter(models.Answer.participant_id == participant.id).count() == 0
+            summary = db.query(models.RoomQuestionStats).filter(models.RoomQuestionStats.room_id == stale.id).one()
+            assert summary.answers_count == 1
+            assert maintenance.archive_old_answers(db, 30, 10) == 0
+        finally:
+            db.close()
+
+    def test_release_idle_rooms_frees_memory(self):
+        """
+        Проверка: Освобождение памяти для комнат без соединений после таймаута простоя.
+        Ожидаемый результат: Пустые записи комнат удалены из ConnectionManager, комната с ведущим осталась.
+        """
+        import maintenance
+        from rooms import ConnectionManager
+        from answer_queue import AnswerQueue
+
+        manager = ConnectionManager()
+        manager.active_connections["IDLE01"] = []
+        manager.room_state("IDLE01")
+        manager.active_connections["LIVE01"] = []
+        manager.room_hosts["LIVE01"] = FakeWebSocket()
+
+        released = maintenance.release_idle_rooms(manager, AnswerQueue(), idle_seconds=0)
+        assert released == ["IDLE01"]
+        assert "IDLE01" not in manager.active_connections
+        assert "IDLE01" not in manager.rooms
+        assert "LIVE01" in manager.active_connections
+
@@ -6,6 +6,7 @@ interface Question {
     id: number;
     text: string;
     timer_seconds: number;
+    question_type?: string;
     choices: Array<{ id: number; text: string }>;
 }
 
@@ -291,12 +292,19 @@ function renderPlayerGame(container: HTMLElement) {
         resultEl.style.display = 'none';
         questionEl.style.display = 'block';
 
+        const isMultiple = q.question_type === 'multiple';
+        const selected = new Set<number>();
+
         questionEl.textContent = q.text;
         choicesEl.innerHTML = q.choices.map((c: any) => `
             <button class="answer-btn" data-id="${c.id}" ${answered ? 'disabled' : ''}>
                 ${c.text}
             </button>
-        `).join('');
+        `).join('') + (isMultiple ? `
+            <button id="submit-multiple-btn" class="btn-primary" style="grid-column: 1 / -1;" ${answered ? 'disabled' : ''}>
+                Ответить
+            </button>
+        ` : '');
 
         questionStartTime = Date.now();
 
@@ -307,25 +315,46 @@ function renderPlayerGame(container: HTMLElement) {
             timerEl.style.width = '0%';
         }, 50);
 
+        const submit = (choiceIds: number[]) => {
+            if (!answered && socket && socket.readyState === WebSocket.OPEN) {
+                const responseTime = (Date.now() - questionStartTime) / 1000;  
+                
+                socket!.send(JSON.stringify({
+                    action: 'submit_answer',
+                    participant_id: participantId,
+                    question_id: q.id,
+                    choice_ids: choiceIds,
+                    response_time: responseTime
+                }));
+                
+                answered = true;
+                choicesEl.querySelectorAll('button').forEach(b => b.disabled = true);
+            }
+        };
+
         choicesEl.querySelectorAll('.answer-btn').forEach(btn => {
             btn.addEventListener('click', () => {
-                if (!answered && socket && socket.readyState === WebSocket.OPEN) {
-                    const responseTime = (Date.now() - questionStartTime) / 1000;  
-                    const choiceId = btn.getAttribute('data-id');
-                    
-                    socket!.send(JSON.stringify({
-                        action: 'submit_answer',
-                        participant_id: participantId,
-                        question_id: q.id,
-                        choice_id: parseInt(choiceId!),
-                        response_time: responseTime
-                    }));
-                    
-                    answered = true;
-                    choicesEl.querySelectorAll('button').forEach(b => b.disabled = true);
+                const choiceId = parseInt(btn.getAttribute('data-id')!);
+                if (!isMultiple) {
+                    submit([choiceId]);
+                    return;
+                }
+                if (answered) return;
+                if (selected.has(choiceId)) {
+                    selected.delete(choiceId);
+                    btn.classList.remove('selected');
+                } else {
+                    selected.add(choiceId);
+                    btn.classList.add('selected');
                 }
             });
         });
+
+        document.getElementById('submit-multiple-btn')?.addEventListener('click', () => {
+            if (selected.size > 0) {
+                submit(Array.from(selected));
+            }
+        });
     }
 
     document.getElementById('leave-btn')?.addEventListener('click', () => {